@@ -12,7 +12,7 @@ setup(
     packages=['vimiv'],
     ext_modules = [enhance_module],
     scripts=['vimiv/vimiv'],
-    install_requires=['PyGObject'],
+    install_requires=['PyGObject', 'pycairo'],
     description="An image viewer with vim-like keybindings",
     license="MIT",
     url="https://github.com/karlch/vimiv",
@@ -46,6 +46,18 @@ class AnimationTest(VimivTestCase):
         self.image.zoom_delta(zoom_in=False)
         self.assertEqual(self.image.get_zoom_percent(), start)
 
+    def test_play_zoomed_animation(self):
+        """Keep playing frames at the zoomed size."""
+        self.image.zoom_delta()
+        refresh_gui(0.2)
+        width = self.image.get_pixbuf().get_width()
+        self.assertEqual(self.image.get_size_request()[0],
+                         int(width * self.image.zoom_percent))
+        first_pb = self.image.get_pixbuf().copy()
+        refresh_gui(0.1)
+        self.assertFalse(compare_pixbufs(first_pb, self.image.get_pixbuf()))
+        self.image.zoom_delta(zoom_in=False)
+
     def test_overzoom(self):
         """Test overzoom at opening and fit afterwards for animations."""
         # Overzoom is respected
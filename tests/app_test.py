@@ -56,6 +56,7 @@ class AppTest(VimivTestCase):
         self.assertIn("/tmp/vimiv-", os.getenv("XDG_CACHE_HOME"))
         self.assertIn("/tmp/vimiv-", os.getenv("XDG_CONFIG_HOME"))
         self.assertIn("/tmp/vimiv-", os.getenv("XDG_DATA_HOME"))
+        self.assertIn("/tmp/vimiv-", os.getenv("XDG_RUNTIME_DIR"))
         # Thumbnail, Tag and Trash directory should contain tmp
         self.assertIn("/tmp/", self.vimiv["thumbnail"].get_cache_directory())
         self.assertIn("/tmp/", self.vimiv["tags"].directory)
@@ -123,6 +123,52 @@ class FileActionsTest(VimivTestCase):
         self.assertTrue(fileactions.is_image("testimages/arch_001.jpg"))
         self.assertFalse(fileactions.is_image("testimages/not_an_image.jpg"))
 
+    def test_get_file_info(self):
+        """Get cached information on the format of a file."""
+        info = fileactions.get_file_info("testimages/arch_001.jpg")
+        self.assertIn("jpeg", info.extensions)
+        self.assertFalse(info.animation)
+        self.assertIs(info,
+                      fileactions.get_file_info("testimages/arch_001.jpg"))
+        self.assertTrue(fileactions.get_file_info(
+            "testimages/animation/animation.gif").animation)
+        self.assertIsNone(fileactions.get_file_info("testimages/nothing"))
+        # Changed files are checked again
+        shutil.copyfile("testimages/arch_001.jpg", "testimages/to_change")
+        self.assertTrue(fileactions.is_image("testimages/to_change"))
+        with open("testimages/to_change", "w") as f:
+            f.write("no image")
+        self.assertFalse(fileactions.is_image("testimages/to_change"))
+        os.remove("testimages/to_change")
+
+    def test_get_file_info_cache_size(self):
+        """Only cache information on the most recently checked files."""
+        cache_size = fileactions.FILE_INFO_CACHE_SIZE
+        fileactions.FILE_INFO_CACHE_SIZE = 1
+        try:
+            info = fileactions.get_file_info("testimages/arch_001.jpg")
+            self.assertIs(
+                info, fileactions.get_file_info("testimages/arch_001.jpg"))
+            fileactions.get_file_info("testimages/arch-logo.png")
+            self.assertIsNot(
+                info, fileactions.get_file_info("testimages/arch_001.jpg"))
+        finally:
+            fileactions.FILE_INFO_CACHE_SIZE = cache_size
+
+    def test_get_frame_count(self):
+        """Count the frames of a gif."""
+        frame = b"!\xf9\x04\x01\x0a\x00\x00\x00" \
+            b",\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00"
+        with open("testimages/frames.gif", "wb") as f:
+            f.write(b"GIF89a\x01\x00\x01\x00\x80\x00\x00"
+                    b"\x00\x00\x00\xff\xff\xff" + 3 * frame + b";")
+        self.assertEqual(fileactions.get_frame_count("testimages/frames.gif"),
+                         3)
+        os.remove("testimages/frames.gif")
+        self.assertEqual(
+            fileactions.get_frame_count("testimages/arch_001.jpg"), 0)
+        self.assertEqual(fileactions.get_frame_count("testimages/nothing"), 0)
+
 
 if __name__ == "__main__":
     main()
@@ -4,6 +4,11 @@
 import os
 from unittest import main
 
+from gi import require_version
+require_version("GdkPixbuf", "2.0")
+from gi.repository import GdkPixbuf
+from vimiv.pixbuf_cache import image_cache
+
 from vimiv_testcase import VimivTestCase, refresh_gui
 
 
@@ -43,27 +48,33 @@ class ImageTest(VimivTestCase):
         # Zoom to a size representing half the image size
         self.image.zoom_to(0.5)
         self.assertEqual(self.image.zoom_percent, 0.5)
-        pixbuf = self.image.get_pixbuf()
-        self.assertEqual(width * 0.5, pixbuf.get_width())
+        self.assertEqual(width * 0.5, self.image.get_size_request()[0])
         # Zoom by eventhandler
         self.vimiv["eventhandler"].set_num_str(0.3)
         self.image.zoom_to(0)
         self.assertEqual(self.image.zoom_percent, 0.3)
-        pixbuf = self.image.get_pixbuf()
-        self.assertEqual(width * 0.3, pixbuf.get_width())
+        self.assertEqual(width * 0.3, self.image.get_size_request()[0])
         # Zoom back to fit
         self.image.zoom_to(0)
         self.assertEqual(self.image.zoom_percent,
                          self.image.get_zoom_percent_to_fit())
-        pixbuf = self.image.get_pixbuf()
-        self.assertEqual(width * self.image.get_zoom_percent_to_fit(),
-                         pixbuf.get_width())
+        self.assertEqual(int(width * self.image.get_zoom_percent_to_fit()),
+                         self.image.get_size_request()[0])
         # Unreasonable zoom
         self.image.zoom_to(1000)
         self.check_statusbar("WARNING: Image cannot be zoomed this far")
+        self.assertEqual(int(width * self.image.get_zoom_percent_to_fit()),
+                         self.image.get_size_request()[0])
+
+    def test_zoom_does_not_scale_pixbuf(self):
+        """Zooming only changes the drawn size, not the drawn pixbuf."""
+        refresh_gui(0.05)
         pixbuf = self.image.get_pixbuf()
-        self.assertEqual(width * self.image.get_zoom_percent_to_fit(),
-                         pixbuf.get_width())
+        self.image.zoom_to(4)
+        self.assertIs(pixbuf, self.image.get_pixbuf())
+        self.assertEqual(self.image.get_size_request()[0],
+                         4 * pixbuf.get_width())
+        self.image.zoom_to(0)
 
     def test_zoom_from_commandline(self):
         """Test zooming from command line."""
@@ -112,6 +123,31 @@ class ImageTest(VimivTestCase):
         self.image.move_pos(forward=False)
         self.assertEqual(0, self.vimiv.get_index())
 
+    def test_move_quickly(self):
+        """Show the last image after moving faster than images are loaded."""
+        image_cache.clear()
+        for _ in range(3):
+            self.image.move_index()
+        refresh_gui(0.2)
+        _, width, _ = GdkPixbuf.Pixbuf.get_file_info(self.vimiv.get_path())
+        self.assertEqual(self.image.get_size_request()[0],
+                         int(width * self.image.zoom_percent))
+        self.image.move_index(forward=False, delta=3)
+        self.assertEqual(1, self.vimiv.get_index())
+
+    def test_rescale_svg(self):
+        """Render svgs at the displayed size."""
+        svg = os.path.abspath("vimiv/testimages/vimiv.svg")
+        delta = self.vimiv.get_paths().index(svg) - self.vimiv.get_index()
+        self.image.move_index(delta=delta)
+        refresh_gui(0.2)
+        self.run_command("zoom_to 3")
+        refresh_gui(0.2)
+        height = self.image.get_size_request()[1]
+        self.assertEqual(self.image.get_pixbuf().get_height(), height)
+        self.image.move_index(delta=-delta)
+        self.assertEqual(1, self.vimiv.get_index())
+
     def test_settings(self):
         """Change image.py settings."""
         # Rescale svg
@@ -0,0 +1,128 @@
+# vim: ft=python fileencoding=utf-8 sw=4 et sts=4
+"""Test pixbuf_cache.py for vimiv's test suite."""
+
+import os
+import shutil
+import tempfile
+from math import ceil
+from unittest import TestCase, main
+
+from gi import require_version
+require_version("GdkPixbuf", "2.0")
+from gi.repository import GdkPixbuf
+from vimiv.pixbuf_cache import PixbufCache, fit_into
+from vimiv.settings import settings
+
+
+class PixbufCacheTest(TestCase):
+    """PixbufCache Tests."""
+
+    def setUp(self):
+        self.cache = PixbufCache("image_cache_mb")
+        self.tmpdir = tempfile.TemporaryDirectory(prefix="vimivtests-")
+        self.paths = []
+        for name in ["a.png", "b.png", "c.png"]:
+            path = os.path.join(self.tmpdir.name, name)
+            shutil.copyfile("vimiv/testimages/arch-logo.png", path)
+            self.paths.append(path)
+
+    def test_load_and_get(self):
+        """Load an image into the cache and receive it again."""
+        self.assertIsNone(self.cache.get(self.paths[0]))
+        pixbuf = self.cache.load(self.paths[0])
+        self.assertIs(pixbuf, self.cache.get(self.paths[0]))
+        self.assertEqual(pixbuf.get_byte_length(),
+                         self.cache.get_used_bytes())
+        # Loading without storing does not change the cache
+        self.cache.load(self.paths[1], store=False)
+        self.assertIsNone(self.cache.get(self.paths[1]))
+        # Cancelled decoding returns and stores nothing
+        self.assertIsNone(self.cache.load(self.paths[2],
+                                          cancelled=lambda: True))
+        self.assertIsNone(self.cache.get(self.paths[2]))
+
+    def test_fit_into(self):
+        """Shrink sizes to fit into a bound."""
+        self.assertEqual(fit_into(100, 50, None), (100, 50))
+        self.assertEqual(fit_into(100, 50, (200, 200)), (100, 50))
+        self.assertEqual(fit_into(100, 50, (50, 50)), (50, 25))
+        self.assertEqual(fit_into(50, 100, (50, 20)), (10, 20))
+        self.assertEqual(fit_into(1000, 1, (10, 10)), (10, 1))
+
+    def test_load_shrunk(self):
+        """Load images shrunk to fit into a bound."""
+        full = GdkPixbuf.Pixbuf.new_from_file(self.paths[0])
+        half = (full.get_width() // 2, full.get_height())
+        pixbuf = self.cache.load(self.paths[0], half)
+        self.assertEqual(pixbuf.get_width(), half[0])
+        self.assertLess(pixbuf.get_height(), full.get_height())
+        self.assertIs(pixbuf, self.cache.get(self.paths[0], half))
+        self.assertIsNone(self.cache.get(self.paths[0]))
+        # Only one shrunk pixbuf is stored per path
+        quarter = (full.get_width() // 4, full.get_height())
+        self.cache.load(self.paths[0], quarter)
+        self.assertIsNone(self.cache.get(self.paths[0], half))
+        # The full resolution pixbuf is served for any bound
+        full = self.cache.load(self.paths[0])
+        self.assertIs(full, self.cache.get(self.paths[0], (1, 1)))
+        # Images smaller than the bound are stored in full resolution
+        pixbuf = self.cache.load(self.paths[1], (10000, 10000))
+        self.assertIs(pixbuf, self.cache.get(self.paths[1]))
+        # As are images which exactly fit into the bound
+        exact = (full.get_width(), full.get_height())
+        pixbuf = self.cache.load(self.paths[2], exact)
+        self.assertIs(pixbuf, self.cache.get(self.paths[2]))
+
+    def test_changed_file_is_not_served(self):
+        """Do not return pixbufs of files that changed on disk."""
+        self.cache.load(self.paths[0])
+        pixbuf = GdkPixbuf.Pixbuf.new_from_file(self.paths[0])
+        pixbuf = pixbuf.rotate_simple(90)
+        pixbuf.savev(self.paths[0], "png", [], [])
+        self.assertIsNone(self.cache.get(self.paths[0]))
+
+    def test_evict_least_recently_used(self):
+        """Evict the least recently used pixbuf when over budget."""
+        size = GdkPixbuf.Pixbuf.new_from_file(self.paths[0]).get_byte_length()
+        budget = max(1, ceil(2 * size / 1024 / 1024))
+        settings.override("image_cache_mb", str(budget))
+        # Create one image more than fits into the cache
+        fitting = budget * 1024 * 1024 // size
+        while len(self.paths) <= fitting:
+            path = os.path.join(self.tmpdir.name, "%d.png" % len(self.paths))
+            shutil.copyfile(self.paths[0], path)
+            self.paths.append(path)
+        for path in self.paths[:-1]:
+            self.cache.load(path)
+        # Access the first path so the second one is the least recently used
+        self.cache.get(self.paths[0])
+        self.cache.load(self.paths[-1])
+        self.assertIsNotNone(self.cache.get(self.paths[0]))
+        self.assertIsNone(self.cache.get(self.paths[1]))
+        self.assertIsNotNone(self.cache.get(self.paths[-1]))
+        self.assertLessEqual(self.cache.get_used_bytes(),
+                             budget * 1024 * 1024)
+        # A budget of zero does not store anything
+        settings.override("image_cache_mb", "0")
+        self.cache.clear()
+        self.cache.load(self.paths[0])
+        self.assertIsNone(self.cache.get(self.paths[0]))
+        settings.override("image_cache_mb")
+
+    def test_remove_and_clear(self):
+        """Remove single paths and clear the cache."""
+        for path in self.paths:
+            self.cache.load(path)
+        self.cache.remove(self.paths[0])
+        self.assertIsNone(self.cache.get(self.paths[0]))
+        self.assertIsNotNone(self.cache.get(self.paths[1]))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get(self.paths[1]))
+        self.assertEqual(self.cache.get_used_bytes(), 0)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# vim: ft=python fileencoding=utf-8 sw=4 et sts=4
+"""Test prefetch.py for vimiv's test suite."""
+
+import os
+from unittest import main
+
+from vimiv.pixbuf_cache import image_cache
+from vimiv.prefetch import Prefetcher
+from vimiv.thumbnail_manager import ThumbnailStore
+
+from vimiv_testcase import VimivTestCase, refresh_gui
+
+
+class PrefetchTest(VimivTestCase):
+    """Prefetch Tests."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.init_test(cls, ["vimiv/testimages/arch_001.jpg"])
+        cls.prefetcher = Prefetcher(cls.vimiv)
+
+    def setUp(self):
+        refresh_gui(0.05)  # Finish loading the current image
+        image_cache.clear()
+
+    def wait_for(self, path):
+        """Wait until path was prefetched."""
+        for _ in range(100):
+            if self.prefetcher.get(path) is not None:
+                return
+            refresh_gui(0.01)
+
+    def test_prefetch_neighbours(self):
+        """Prefetch the images next to the current one."""
+        paths = self.vimiv.get_paths()
+        index = self.vimiv.get_index()
+        next_path = paths[(index + 1) % len(paths)]
+        prev_path = paths[(index - 1) % len(paths)]
+        self.prefetcher.prefetch()
+        self.wait_for(next_path)
+        self.wait_for(prev_path)
+        self.assertIsNotNone(self.prefetcher.get(next_path))
+        self.assertIsNotNone(self.prefetcher.get(prev_path))
+        # Images further away are not prefetched
+        far_path = paths[(index + 3) % len(paths)]
+        self.assertIsNone(self.prefetcher.get(far_path))
+
+    def test_prefetch_disabled(self):
+        """Do not prefetch anything if prefetch_count is 0."""
+        self.settings.override("prefetch_count", "0")
+        self.prefetcher.prefetch()
+        paths = self.vimiv.get_paths()
+        next_path = paths[(self.vimiv.get_index() + 1) % len(paths)]
+        self.assertIsNone(self.prefetcher.get(next_path))
+        self.settings.override("prefetch_count", "1")
+
+    def test_move_shows_prefetched_image(self):
+        """Moving to a prefetched image shows it immediately."""
+        paths = self.vimiv.get_paths()
+        next_path = paths[(self.vimiv.get_index() + 1) % len(paths)]
+        self.vimiv["image"].load()
+        self.wait_for(next_path)
+        self.vimiv["image"].move_index()
+        # No need to refresh the gui, the image is shown directly
+        self.assertEqual(self.vimiv.get_path(), next_path)
+        self.assertTrue(self.vimiv["image"].get_pixbuf())
+        self.vimiv["image"].move_index(forward=False)
+
+    def test_save_thumbnail_of_prefetched_image(self):
+        """Save the thumbnail of a prefetched image when moving to it."""
+        paths = self.vimiv.get_paths()
+        next_path = paths[(self.vimiv.get_index() + 1) % len(paths)]
+        size = self.vimiv["thumbnail"].get_zoom_level()[0]
+        # Start without a thumbnail of the next image
+        os.remove(ThumbnailStore().get_thumbnail(next_path, size=size))
+        self.assertFalse(ThumbnailStore().has_thumbnail(next_path, size))
+        self.vimiv["image"].load()
+        self.wait_for(next_path)
+        self.vimiv["image"].move_index()
+        for _ in range(100):
+            if ThumbnailStore().has_thumbnail(next_path, size):
+                break
+            refresh_gui(0.01)
+        self.assertTrue(ThumbnailStore().has_thumbnail(next_path, size))
+        self.vimiv["image"].move_index(forward=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -228,6 +228,11 @@ class SettingStorageTest(TestCase):
                     "thumb_padding": 10,
                     "completion_height": 200,
                     "play_animations": True,
+                    "prefetch_count": 1,
+                    "image_cache_mb": 256,
+                    "thumbnail_cache_mb": 64,
+                    "thumbnail_disk_mb": 1024,
+                    "thumbnail_gc_on_start": False,
                     "start_show_library": False,
                     "library_width": 300,
                     "expand_lib": True,
@@ -0,0 +1,107 @@
+# vim: ft=python fileencoding=utf-8 sw=4 et sts=4
+"""Test thumbnail_daemon.py for vimiv's test suite."""
+
+import os
+import shutil
+import socket
+import tempfile
+import time
+from multiprocessing.pool import ThreadPool as Pool
+from threading import Thread
+from unittest import TestCase, main
+
+from gi import require_version
+require_version('Gtk', '3.0')
+from vimiv.thumbnail_client import ThumbnailClient
+from vimiv.thumbnail_daemon import ThumbnailDaemon
+
+
+class ThumbnailDaemonTest(TestCase):
+    """Test creating thumbnails through the thumbnail daemon."""
+
+    @classmethod
+    def setUpClass(cls):
+        # Thumbnails must not be written to the real cache
+        cls.cachedir = tempfile.TemporaryDirectory(prefix="vimivtests-")
+        cls.cache_home = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = cls.cachedir.name
+        cls.tmpdir = tempfile.TemporaryDirectory(prefix="vimivtests-")
+        cls.socket_path = os.path.join(cls.tmpdir.name, "thumbnails.sock")
+        cls.daemon = ThumbnailDaemon(cls.socket_path, jobs=2)
+        Thread(target=cls.daemon.serve_forever, daemon=True).start()
+        cls.client = ThumbnailClient(cls.socket_path)
+        while not cls.client.is_available():
+            time.sleep(0.01)
+
+    def test_get_thumbnail(self):
+        """Request the same thumbnail from several clients at once."""
+        image = os.path.join(self.tmpdir.name, "arch-logo.png")
+        shutil.copyfile("vimiv/testimages/arch-logo.png", image)
+        with Pool(4) as pool:
+            thumbnails = pool.map(
+                lambda _: self.client.get_thumbnail(image, 256), range(4))
+        self.assertIsNotNone(thumbnails[0])
+        self.assertTrue(os.path.isfile(thumbnails[0]))
+        self.assertEqual(thumbnails, thumbnails[:1] * 4)
+        # Forcing a recreation returns the same thumbnail file
+        self.assertEqual(self.client.get_thumbnail(image, 256, True),
+                         thumbnails[0])
+        # Thumbnails removed by other programs are created again
+        os.remove(thumbnails[0])
+        self.assertEqual(self.client.get_thumbnail(image, 256), thumbnails[0])
+        self.assertTrue(os.path.isfile(thumbnails[0]))
+
+    def test_fail_get_thumbnail(self):
+        """Fail getting thumbnails from the daemon."""
+        text = os.path.join(self.tmpdir.name, "text")
+        with open(text, "w") as f:
+            f.write("not an image")
+        self.assertIsNone(self.client.get_thumbnail(text, 256))
+        # Missing files do not break later requests
+        missing = os.path.join(self.tmpdir.name, "missing.png")
+        for _ in range(2):
+            self.assertIsNone(self.client.get_thumbnail(missing, 256))
+        # No daemon listening
+        client = ThumbnailClient(os.path.join(self.tmpdir.name, "none.sock"))
+        self.assertFalse(client.is_available())
+        with self.assertRaises(OSError):
+            client.get_thumbnail(text, 256)
+        # Daemon which does not answer
+        hanging_path = os.path.join(self.tmpdir.name, "hanging.sock")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as hanging:
+            hanging.bind(hanging_path)
+            hanging.listen(1)
+            client = ThumbnailClient(hanging_path, timeout=0.1)
+            with self.assertRaises(OSError):
+                client.get_thumbnail(text, 256)
+
+    def test_serve_on_used_socket(self):
+        """Keep the socket of a running daemon and replace stale ones."""
+        self.assertTrue(self.client.is_running())
+        with self.assertRaises(OSError):
+            ThumbnailDaemon(self.socket_path).serve_forever()
+        self.assertTrue(self.client.is_running())
+        # Socket left behind by a daemon which was killed
+        stale_path = os.path.join(self.tmpdir.name, "stale.sock")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+            stale.bind(stale_path)
+        client = ThumbnailClient(stale_path)
+        self.assertTrue(client.is_available())
+        self.assertFalse(client.is_running())
+        daemon = ThumbnailDaemon(stale_path)
+        Thread(target=daemon.serve_forever, daemon=True).start()
+        while not client.is_running():
+            time.sleep(0.01)
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.cache_home is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = cls.cache_home
+        cls.tmpdir.cleanup()
+        cls.cachedir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# vim: ft=python fileencoding=utf-8 sw=4 et sts=4
+"""Test thumbnail_generator.py for vimiv's test suite."""
+
+import io
+import os
+import shutil
+import tempfile
+from unittest import TestCase, main
+
+from gi import require_version
+require_version('Gtk', '3.0')
+from vimiv.thumbnail_generator import find_images, generate_thumbnails
+from vimiv.thumbnail_manager import ThumbnailStore
+
+
+class ThumbnailGeneratorTest(TestCase):
+    """Test generating thumbnails for a directory."""
+
+    def setUp(self):
+        # Thumbnails must not be written to the real cache
+        self.cachedir = tempfile.TemporaryDirectory(prefix="vimivtests-")
+        self.cache_home = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = self.cachedir.name
+        self.tmpdir = tempfile.TemporaryDirectory(prefix="vimivtests-")
+        self.images = []
+        subdir = os.path.join(self.tmpdir.name, "sub")
+        os.mkdir(subdir)
+        for directory, name in [(self.tmpdir.name, "a.png"),
+                                (self.tmpdir.name, "b.jpg"),
+                                (subdir, "c.png")]:
+            path = os.path.join(directory, name)
+            source = "arch-logo.png" if name.endswith("png") \
+                else "arch_001.jpg"
+            shutil.copyfile(os.path.join("vimiv/testimages", source), path)
+            self.images.append(path)
+        with open(os.path.join(self.tmpdir.name, "text"), "w") as f:
+            f.write("not an image")
+
+    def test_find_images(self):
+        """Find images in a directory."""
+        self.assertEqual(find_images(self.tmpdir.name), self.images[:2])
+        self.assertEqual(find_images(self.tmpdir.name, recursive=True),
+                         self.images)
+
+    def test_generate_thumbnails(self):
+        """Generate missing thumbnails and skip existing ones."""
+        output = io.StringIO()
+        self.assertEqual(generate_thumbnails(self.tmpdir.name, jobs=2,
+                                             output=output), 0)
+        self.assertIn("2 images, 2 thumbnails to create", output.getvalue())
+        store = ThumbnailStore()
+        for image in self.images[:2]:
+            self.assertTrue(store.has_thumbnail(image))
+        self.assertFalse(store.has_thumbnail(self.images[2]))
+        # Continue recursively, existing thumbnails are not created again
+        output = io.StringIO()
+        generate_thumbnails(self.tmpdir.name, recursive=True, output=output)
+        self.assertIn("3 images, 1 thumbnails to create", output.getvalue())
+        self.assertTrue(store.has_thumbnail(self.images[2]))
+        # Normal thumbnails are separate
+        self.assertFalse(store.has_thumbnail(self.images[0], size=128))
+        generate_thumbnails(self.tmpdir.name, tier="normal", output=output)
+        self.assertTrue(store.has_thumbnail(self.images[0], size=128))
+
+    def test_fail_generate_thumbnails(self):
+        """Fail generating thumbnails for a file."""
+        output = io.StringIO()
+        self.assertEqual(generate_thumbnails(self.images[0], output=output),
+                         1)
+        self.assertIn("Not a directory", output.getvalue())
+
+    def tearDown(self):
+        if self.cache_home is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cache_home
+        self.tmpdir.cleanup()
+        self.cachedir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,12 +9,16 @@ import hashlib
 import os
 import shutil
 import tempfile
+import time
 from unittest import TestCase, main
 
 from gi import require_version
 require_version('Gtk', '3.0')
+from gi.repository import GdkPixbuf
 from vimiv.helpers import get_user_cache_dir
-from vimiv.thumbnail_manager import ThumbnailStore
+from vimiv.thumbnail_manager import (ThumbnailScheduler, ThumbnailStore,
+                                     apply_orientation, read_png_text)
+from vimiv.transform import AppliedChange
 
 
 class ThumbnailManagerTest(TestCase):
@@ -22,6 +26,10 @@ class ThumbnailManagerTest(TestCase):
 
     @classmethod
     def setUpClass(cls):
+        # Run in tmp, garbage collection must not touch the real cache
+        cls.tmpdir = tempfile.TemporaryDirectory(prefix="vimivtests-")
+        cls.cache_home = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = cls.tmpdir.name
         cls.thumb_store = ThumbnailStore()
         cache_dir = get_user_cache_dir()
         cls.thumb_dir = os.path.join(cache_dir, "thumbnails/large")
@@ -50,6 +58,202 @@ class ThumbnailManagerTest(TestCase):
         # A file that does not exist
         self.assertFalse(self.thumb_store.get_thumbnail("bla"))
 
+    def test_find_thumbnail_of_other_store(self):
+        """Find thumbnails written by other programs after indexing."""
+        new_dir = tempfile.TemporaryDirectory(prefix="vimivtests-")
+        new_file = os.path.join(new_dir.name, "test.png")
+        shutil.copyfile("vimiv/testimages/arch-logo.png", new_file)
+        self.assertFalse(self.thumb_store.has_thumbnail(new_file))
+        thumbnail = ThumbnailStore().get_thumbnail(new_file)
+        # Directories are checked for changes once every INDEX_INTERVAL
+        time.sleep(ThumbnailStore.INDEX_INTERVAL + 0.1)
+        self.assertTrue(self.thumb_store.has_thumbnail(new_file))
+        self.assertEqual(self.thumb_store.get_thumbnail(new_file), thumbnail)
+        new_dir.cleanup()
+
+    def test_recreate_removed_thumbnail(self):
+        """Create thumbnails again which were removed by another program."""
+        new_dir = tempfile.TemporaryDirectory(prefix="vimivtests-")
+        new_file = os.path.join(new_dir.name, "test.png")
+        shutil.copyfile("vimiv/testimages/arch-logo.png", new_file)
+        thumbnail = self.thumb_store.get_thumbnail(new_file)
+        self.assertTrue(self.thumb_store.has_thumbnail(new_file))
+        os.remove(thumbnail)
+        self.assertFalse(self.thumb_store.has_thumbnail(new_file))
+        self.assertEqual(self.thumb_store.get_thumbnail(new_file), thumbnail)
+        self.assertTrue(os.path.isfile(thumbnail))
+        new_dir.cleanup()
+
+    def test_collect_garbage(self):
+        """Remove outdated thumbnails and limit the size of the cache."""
+        new_dir = tempfile.TemporaryDirectory(prefix="vimivtests-")
+        thumbnails = []
+        for name in ["kept.png", "removed.png"]:
+            new_file = os.path.join(new_dir.name, name)
+            shutil.copyfile("vimiv/testimages/arch-logo.png", new_file)
+            thumbnails.append(self.thumb_store.get_thumbnail(new_file))
+        os.remove(new_file)
+        old_fail_dir = os.path.join(self.thumb_store.base_dir, "fail",
+                                    "vimiv-0.0.1")
+        os.makedirs(old_fail_dir, exist_ok=True)
+        with open(os.path.join(old_fail_dir, "test.png"), "w") as f:
+            f.write("fail")
+        removed, freed = self.thumb_store.collect_garbage()
+        self.assertGreaterEqual(removed, 2)
+        self.assertGreater(freed, 0)
+        self.assertTrue(os.path.isfile(thumbnails[0]))
+        self.assertFalse(os.path.exists(thumbnails[1]))
+        self.assertFalse(os.path.exists(old_fail_dir))
+        # Least recently used thumbnails are removed to fit into the budget
+        self.thumb_store.collect_garbage(budget=1)
+        self.assertFalse(os.path.exists(thumbnails[0]))
+        new_dir.cleanup()
+
+    def test_save_thumbnail(self):
+        """Create thumbnails from already decoded images."""
+        new_dir = tempfile.TemporaryDirectory(prefix="vimivtests-")
+        new_file = os.path.join(new_dir.name, "test.jpg")
+        shutil.copyfile("vimiv/testimages/arch_001.jpg", new_file)
+        pixbuf = GdkPixbuf.Pixbuf.new_from_file(new_file)
+        thumbnail = self.thumb_store.save_thumbnail(new_file, pixbuf)
+        self.assertTrue(self.thumb_store.has_thumbnail(new_file))
+        self.assertEqual(thumbnail, self.thumb_store.get_thumbnail(new_file))
+        self.assertEqual(max(GdkPixbuf.Pixbuf.get_file_info(thumbnail)[1:]),
+                         256)
+        # Pixbufs smaller than the thumbnail are not used
+        small = pixbuf.scale_simple(10, 10, GdkPixbuf.InterpType.NEAREST)
+        self.assertIsNone(self.thumb_store.save_thumbnail(new_file, small,
+                                                          size=512))
+        self.assertFalse(self.thumb_store.has_thumbnail(new_file, size=512))
+        new_dir.cleanup()
+
+    def test_transform_thumbnail(self):
+        """Apply rotations and flips to existing thumbnails."""
+        new_dir = tempfile.TemporaryDirectory(prefix="vimivtests-")
+        new_file = os.path.join(new_dir.name, "test.png")
+        shutil.copyfile("vimiv/testimages/arch-logo.png", new_file)
+        thumbnail = self.thumb_store.get_thumbnail(new_file)
+        expected = GdkPixbuf.Pixbuf.new_from_file(thumbnail)
+        expected = expected.rotate_simple(90).flip(True)
+        change = AppliedChange(1, 1, 0, int(os.path.getmtime(new_file)), 1)
+        pixbuf = GdkPixbuf.Pixbuf.new_from_file(new_file)
+        pixbuf.rotate_simple(90).flip(True).savev(new_file, "png", [], [])
+        os.utime(new_file, (change.mtime + 10, change.mtime + 10))
+        self.assertTrue(self.thumb_store.transform_thumbnail(new_file, change))
+        self.assertTrue(self.thumb_store.has_thumbnail(new_file))
+        transformed = GdkPixbuf.Pixbuf.new_from_file(thumbnail)
+        self.assertEqual(transformed.get_pixels(), expected.get_pixels())
+        # Outdated thumbnails and rotated images are not transformed
+        self.assertFalse(self.thumb_store.transform_thumbnail(new_file,
+                                                              change))
+        change = change._replace(mtime=change.mtime + 10, orientation=6)
+        self.assertFalse(self.thumb_store.transform_thumbnail(new_file,
+                                                              change))
+        new_dir.cleanup()
+
+    def test_read_png_text(self):
+        """Read the tEXt chunks of a thumbnail without decoding it."""
+        new_dir = tempfile.TemporaryDirectory(prefix="vimivtests-")
+        new_file = os.path.join(new_dir.name, "test.png")
+        shutil.copyfile("vimiv/testimages/arch-logo.png", new_file)
+        thumbnail = self.thumb_store.get_thumbnail(new_file)
+        text = read_png_text(thumbnail)
+        self.assertEqual(text["Thumb::URI"], "file://" + new_file)
+        self.assertEqual(text["Thumb::MTime"],
+                         str(int(os.path.getmtime(new_file))))
+        self.assertEqual(text["Thumb::Size"],
+                         str(os.path.getsize(new_file)))
+        # Not a png and a file that does not exist
+        self.assertEqual(read_png_text("vimiv/testimages/arch_001.jpg"), {})
+        self.assertEqual(read_png_text("bla"), {})
+        new_dir.cleanup()
+
+    def test_thumbnail_tiers(self):
+        """Use the smallest tier covering the size and derive from larger."""
+        self.assertEqual(ThumbnailStore.get_tier(64), "normal")
+        self.assertEqual(ThumbnailStore.get_tier(256), "large")
+        self.assertEqual(ThumbnailStore.get_tier(300), "x-large")
+        self.assertEqual(ThumbnailStore.get_tier(5000), "xx-large")
+        new_dir = tempfile.TemporaryDirectory(prefix="vimivtests-")
+        new_file = os.path.join(new_dir.name, "test.jpg")
+        shutil.copyfile("vimiv/testimages/arch_001.jpg", new_file)
+        larger = self.thumb_store.get_thumbnail(new_file, size=512)
+        self.assertIn("thumbnails/x-large", larger)
+        self.assertEqual(max(GdkPixbuf.Pixbuf.get_file_info(larger)[1:]), 512)
+        # Break the source keeping its mtime, the normal thumbnail is still
+        # created from the x-large one
+        mtime = os.path.getmtime(new_file)
+        with open(new_file, "r+b") as f:
+            f.write(bytes(os.path.getsize(new_file)))
+        os.utime(new_file, (mtime, mtime))
+        normal = self.thumb_store.get_thumbnail(new_file, size=100)
+        self.assertIn("thumbnails/normal", normal)
+        self.assertEqual(max(GdkPixbuf.Pixbuf.get_file_info(normal)[1:]), 128)
+        new_dir.cleanup()
+
+    def test_apply_orientation(self):
+        """Orient pixbufs like GdkPixbuf does for embedded orientations."""
+        # Scaled pixbufs carry no options
+        pixbuf = GdkPixbuf.Pixbuf.new_from_file(
+            "vimiv/testimages/arch_001.jpg").scale_simple(
+                30, 20, GdkPixbuf.InterpType.NEAREST)
+        for orientation in range(1, 9):
+            expected = pixbuf.copy()
+            expected.set_option("orientation", str(orientation))
+            expected = expected.apply_embedded_orientation()
+            oriented = apply_orientation(pixbuf, orientation)
+            self.assertEqual(oriented.get_width(), expected.get_width())
+            self.assertEqual(oriented.get_pixels(), expected.get_pixels())
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.cache_home is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = cls.cache_home
+        cls.tmpdir.cleanup()
+
+
+class ThumbnailSchedulerTest(TestCase):
+    """Test the order in which thumbnails are created."""
+
+    def setUp(self):
+        self.scheduler = ThumbnailScheduler()
+        for position in range(100):
+            self.scheduler.add(position, position)
+
+    def pop_all(self):
+        requests = []
+        request = self.scheduler.pop()
+        while request is not None:
+            requests.append(request)
+            request = self.scheduler.pop()
+        return requests
+
+    def test_visible_first(self):
+        """Serve the visible range, then the margin, then the rest."""
+        self.scheduler.set_visible(50, 59, 55)
+        requests = self.pop_all()
+        self.assertEqual(len(requests), 100)
+        self.assertEqual(requests[0], 55)
+        self.assertEqual(sorted(requests[:10]), list(range(50, 60)))
+        self.assertEqual(sorted(requests[10:30]),
+                         list(range(40, 50)) + list(range(60, 70)))
+
+    def test_replace_and_clear(self):
+        """Replace and drop pending requests."""
+        self.scheduler.add(3, "new")
+        self.scheduler.set_visible(0, 9, 3)
+        self.assertEqual(self.scheduler.pop(), "new")
+        self.assertTrue(self.scheduler.discard(4))
+        self.assertFalse(self.scheduler.discard(4))
+        requests = self.pop_all()
+        self.assertNotIn(3, requests)
+        self.assertNotIn(4, requests)
+        self.scheduler.add(1, 1)
+        self.scheduler.clear()
+        self.assertIsNone(self.scheduler.pop())
+
 
 if __name__ == "__main__":
     main()
@@ -139,9 +139,11 @@ class ThumbnailTest(VimivTestCase):
             scale = self._get_pixbuf_scale()
             refresh_gui(0.1)
             count += 1
-        # Zoom out
-        self._zoom_wrapper(False)
-        self._zoom_wrapper(False)
+        # Zoom out swaps in the scaled thumbnails directly
+        self.thumb.zoom(False)
+        self.assertEqual(self._get_pixbuf_scale(), 256)
+        self.thumb.zoom(False)
+        self.assertEqual(self._get_pixbuf_scale(), 128)
         self.assertEqual(self.thumb.get_zoom_level(), (128, 128))
         # Zoom directly with the window implementation of zoom
         self.vimiv["window"].zoom(True)
@@ -149,6 +151,20 @@ class ThumbnailTest(VimivTestCase):
         self.vimiv["window"].zoom(False)
         self.assertEqual(self.thumb.get_zoom_level(), (128, 128))
 
+    def test_show_unchanged_thumbnails(self):
+        """Show created thumbnails directly when entering thumbnail mode."""
+        placeholder = self._get_thumbnail_pixbuf(0)
+        count = 0
+        while self._get_thumbnail_pixbuf(0) is placeholder:
+            if count > 10:
+                self.fail("Thumbnail not created")
+            refresh_gui(0.1)
+            count += 1
+        thumbnail = self._get_thumbnail_pixbuf(0)
+        self.thumb.toggle()
+        self.thumb.toggle()
+        self.assertIs(self._get_thumbnail_pixbuf(0), thumbnail)
+
     def _get_thumbnail_name(self):
         model = self.thumb.get_model()
         index = self.thumb.get_position()
@@ -9,6 +9,7 @@ __author__ = __maintainer__ = "Christian Karl"
 __email__ = "karlch@protonmail.com"
 
 try:
+    import cairo
     from gi import require_version
     require_version("Gtk", "3.0")
     try:
@@ -2,6 +2,7 @@
 """Main application class of vimiv."""
 
 import os
+import signal
 import sys
 import tempfile
 from time import time
@@ -22,6 +23,9 @@ from vimiv.settings import settings
 from vimiv.slideshow import Slideshow
 from vimiv.statusbar import Statusbar
 from vimiv.tags import TagHandler
+from vimiv.thumbnail_daemon import ThumbnailDaemon
+from vimiv.thumbnail_generator import generate_thumbnails
+from vimiv.thumbnail_manager import ThumbnailStore
 from vimiv.transform import Transform
 from vimiv.window import Window
 
@@ -131,11 +135,12 @@ class Vimiv(Gtk.Application):
         if options.contains("temp-basedir"):
             self._tmpdir = tempfile.TemporaryDirectory(prefix="vimiv-")
             tmp = self._tmpdir.name
-            # Export environment variables for thumbnails, tags, history and
-            # logs
+            # Export environment variables for thumbnails, tags, history,
+            # logs and the thumbnail daemon
             os.environ["XDG_CACHE_HOME"] = os.path.join(tmp, "cache")
             os.environ["XDG_CONFIG_HOME"] = os.path.join(tmp, "config")
             os.environ["XDG_DATA_HOME"] = os.path.join(tmp, "data")
+            os.environ["XDG_RUNTIME_DIR"] = os.path.join(tmp, "runtime")
         # Create settings as soon as we know which config files to use
         elif options.contains("config"):
             configfile = options.lookup_value("config").unpack()
@@ -144,6 +149,15 @@ class Vimiv(Gtk.Application):
         else:
             parse_config(running_tests=self.running_tests)
 
+        # Generate thumbnails without starting the gui
+        if options.contains("generate-thumbnails"):
+            set_option("recursive", "recursive", 1)
+            set_option("no-recursive", "recursive", 0)
+            return self._generate_thumbnails(options)
+        # Share thumbnail creation with other instances until interrupted
+        if options.contains("thumbnail-daemon"):
+            return self._run_thumbnail_daemon(options)
+
         # If we start from desktop, move to the wanted directory
         # Else if the input does not come from a tty, e.g. find "" | vimiv, set
         # paths and index according to the input from the pipe
@@ -174,6 +188,56 @@ class Vimiv(Gtk.Application):
 
         return -1  # To continue
 
+    @staticmethod
+    def _generate_thumbnails(options):
+        """Generate thumbnails as requested by the commandline options.
+
+        Args:
+            options: The dictionary containing all options given to the
+                commandline.
+        Return:
+            Exit-code
+        """
+        directory = options.lookup_value("generate-thumbnails").unpack()
+        jobs = options.lookup_value("jobs").unpack() \
+            if options.contains("jobs") else 0
+        size = options.lookup_value("size").unpack() \
+            if options.contains("size") else "large"
+        if size not in ThumbnailStore.TIERS:
+            print("Thumbnail size must be one of %s"
+                  % (", ".join(ThumbnailStore.TIERS)))
+            return 2
+        return generate_thumbnails(directory,
+                                   settings["recursive"].get_value(),
+                                   jobs, size)
+
+    @staticmethod
+    def _run_thumbnail_daemon(options):
+        """Run the thumbnail daemon as requested by the commandline options.
+
+        Args:
+            options: The dictionary containing all options given to the
+                commandline.
+        Return:
+            Exit-code
+        """
+        jobs = options.lookup_value("jobs").unpack() \
+            if options.contains("jobs") else 0
+        daemon = ThumbnailDaemon(jobs=jobs)
+        # The executable resets the handler of SIGINT, which would quit
+        # without removing the socket
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        print("Creating thumbnails for vimiv on %s" % (daemon.socket_path))
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            print("Could not start thumbnail daemon: %s" % (e))
+            return 1
+        return 0
+
     def activate_vimiv(self, app):
         """Starting point for the vimiv application.
 
@@ -192,6 +256,8 @@ class Vimiv(Gtk.Application):
         if not settings["display_bar"].get_value():
             self["statusbar"].hide()
         self["statusbar"].set_separator_height()
+        if settings["thumbnail_gc_on_start"].get_value():
+            self["thumbnail"].collect_garbage(report=False)
         # Try to generate imagelist recursively from the current directory if
         # recursive is given and no paths exist
         if settings["recursive"].get_value() and not self._paths:
@@ -352,6 +418,16 @@ class Vimiv(Gtk.Application):
         add_option("config", 0, "Use FILE as local configuration file",
                    arg=GLib.OptionArg.STRING, value="FILE")
         add_option("debug", 0, "Run in debug mode")
+        add_option("generate-thumbnails", 0,
+                   "Create missing thumbnails for all images in DIR and exit",
+                   arg=GLib.OptionArg.STRING, value="DIR")
+        add_option("thumbnail-daemon", 0,
+                   "Create thumbnails for all running instances")
+        add_option("jobs", 0, "Create thumbnails with N threads",
+                   arg=GLib.OptionArg.INT, value="N")
+        add_option("size", 0, "Create thumbnails of SIZE, normal, large, "
+                   "x-large or xx-large",
+                   arg=GLib.OptionArg.STRING, value="SIZE")
 
     def _init_widgets(self):
         """Create all the other widgets and add them to the class."""
@@ -123,6 +123,8 @@ class Commands(object):
                          positional_args=["tagname"],
                          last_arg_allows_space=True)
         self.add_command("thumbnail", self._app["thumbnail"].toggle)
+        self.add_command("thumbnail_gc",
+                         self._app["thumbnail"].collect_garbage)
         self.add_command("version", self._app["information"].show_version_info)
         self.add_command("w", self._app["transform"].write)
         self.add_command("wq", self._app["transform"].write,
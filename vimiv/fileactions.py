@@ -1,8 +1,10 @@
 # vim: ft=python fileencoding=utf-8 sw=4 et sts=4
 """Different actions applying directly to files."""
 
+import collections
 import os
 from random import shuffle
+from threading import Lock
 
 from gi.repository import Gdk, GdkPixbuf, Gtk
 from vimiv.helpers import listdir_wrapper
@@ -16,6 +18,18 @@ try:
 except ImportError:
     _has_exif = False
 
+FileInfo = collections.namedtuple(
+    "FileInfo", ["format", "extensions", "width", "height", "animation"])
+
+# Amount of files of which the FileInfo is kept
+FILE_INFO_CACHE_SIZE = 10000
+
+# Least recently used first. Key: absolute path;
+# Item: (mtime, size, FileInfo or None)
+_file_info_cache = collections.OrderedDict()
+# Files are checked by the loading and thumbnail threads as well
+_file_info_lock = Lock()
+
 
 def recursive_search(directory):
     """Search a directory recursively for images.
@@ -91,17 +105,51 @@ def populate(args, recursive=False, shuffle_paths=False, expand_single=True):
     return paths, index
 
 
+def get_file_info(filename):
+    """Return information on the image format of a file.
+
+    GdkPixbuf opens and reads the file to find out its format, so the
+    information is cached until modification time or size of the file change.
+    Only the FILE_INFO_CACHE_SIZE most recently checked files are cached.
+
+    Args:
+        filename: Name of file to check.
+    Return:
+        FileInfo namedtuple or None if the file is no supported image.
+    """
+    complete_name = os.path.abspath(os.path.expanduser(filename))
+    try:
+        stat = os.stat(complete_name)
+        with _file_info_lock:
+            cached = _file_info_cache.get(complete_name)
+            if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+                _file_info_cache.move_to_end(complete_name)
+                return cached[2]
+        file_format, width, height = \
+            GdkPixbuf.Pixbuf.get_file_info(complete_name)
+    except (OSError, UnicodeEncodeError):
+        return None
+    info = None
+    if file_format:
+        extensions = file_format.get_extensions()
+        info = FileInfo(file_format, extensions, width, height,
+                        "gif" in extensions)
+    with _file_info_lock:
+        _file_info_cache[complete_name] = \
+            (stat.st_mtime_ns, stat.st_size, info)
+        _file_info_cache.move_to_end(complete_name)
+        while len(_file_info_cache) > FILE_INFO_CACHE_SIZE:
+            _file_info_cache.popitem(last=False)
+    return info
+
+
 def is_image(filename):
     """Check whether a file is an image.
 
     Args:
         filename: Name of file to check.
     """
-    try:
-        complete_name = os.path.abspath(os.path.expanduser(filename))
-        return bool(GdkPixbuf.Pixbuf.get_file_info(complete_name)[0])
-    except UnicodeEncodeError:
-        return False
+    return get_file_info(filename) is not None
 
 
 def is_animation(filename):
@@ -110,9 +158,52 @@ def is_animation(filename):
     Args:
         filename: Name of file to check.
     """
-    complete_name = os.path.abspath(os.path.expanduser(filename))
-    info = GdkPixbuf.Pixbuf.get_file_info(complete_name)[0]
-    return "gif" in info.get_extensions()
+    info = get_file_info(filename)
+    return info.animation if info else False
+
+
+def get_frame_count(filename):
+    """Return the number of frames of a gif or 0 if it cannot be read.
+
+    GdkPixbuf does not tell how many frames an animation has, so the blocks of
+    the file are skipped counting the images.
+
+    Args:
+        filename: Name of the gif.
+    """
+    try:
+        with open(filename, "rb") as f:
+            header = f.read(13)
+            if len(header) < 13 or not header.startswith(b"GIF"):
+                return 0
+            _skip_color_table(f, header[10])
+            frames = 0
+            while True:
+                introducer = f.read(1)
+                if introducer == b"!":  # Extension
+                    f.read(1)
+                elif introducer == b",":  # Image
+                    descriptor = f.read(9)
+                    if len(descriptor) < 9:
+                        return frames
+                    _skip_color_table(f, descriptor[8])
+                    f.read(1)  # Minimum code size of the image data
+                    frames += 1
+                else:  # Trailer or end of a truncated file
+                    return frames
+                # The data is split into sub-blocks ending with an empty one
+                length = f.read(1)
+                while length and length[0]:
+                    f.seek(length[0], os.SEEK_CUR)
+                    length = f.read(1)
+    except OSError:
+        return 0
+
+
+def _skip_color_table(f, flags):
+    """Skip the color table of a gif if flags of the block define one."""
+    if flags & 0x80:
+        f.seek(3 << ((flags & 0x07) + 1), os.SEEK_CUR)
 
 
 def is_svg(filename):
@@ -121,9 +212,8 @@ def is_svg(filename):
     Args:
         filename: Name of file to check.
     """
-    complete_name = os.path.abspath(os.path.expanduser(filename))
-    info = GdkPixbuf.Pixbuf.get_file_info(complete_name)[0]
-    return "svg" in info.get_extensions() if info else False
+    info = get_file_info(filename)
+    return "svg" in info.extensions if info else False
 
 
 def edit_supported(filename):
@@ -132,10 +222,8 @@ def edit_supported(filename):
     Args:
         filename: Name of file to check.
     """
-    complete_name = os.path.abspath(os.path.expanduser(filename))
-    info = GdkPixbuf.Pixbuf.get_file_info(complete_name)[0]
-    extension = info.get_extensions()[0]
-    if extension in ["jpeg", "png", "tiff", "ico", "bmp"]:
+    info = get_file_info(filename)
+    if info and info.extensions[0] in ["jpeg", "png", "tiff", "ico", "bmp"]:
         return True
     return False
 
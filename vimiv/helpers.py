@@ -206,3 +206,14 @@ def get_user_cache_dir():
         return os.environ["XDG_CACHE_HOME"]
     except KeyError:
         return os.path.expanduser("~/.cache")
+
+
+def get_user_runtime_dir():
+    """Return XDG_RUNTIME_DIR according to freedesktop standards.
+
+    Falls back to XDG_CACHE_HOME if the runtime directory is not set.
+    """
+    try:
+        return os.environ["XDG_RUNTIME_DIR"]
+    except KeyError:
+        return get_user_cache_dir()
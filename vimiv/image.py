@@ -1,20 +1,43 @@
 # vim: ft=python fileencoding=utf-8 sw=4 et sts=4
 """Image part of vimiv."""
 
+import collections
+import sys
+from multiprocessing.pool import ThreadPool as Pool
 from random import shuffle
-from threading import Thread
+from time import time
 
-from gi.repository import GdkPixbuf, GLib, Gtk
+import cairo
+from gi.repository import Gdk, GdkPixbuf, GLib, Gtk
 from vimiv.exceptions import StringConversionError
-from vimiv.fileactions import is_animation, is_svg
+from vimiv.fileactions import (get_file_info, get_frame_count, is_animation,
+                               is_svg)
 from vimiv.helpers import get_float
+from vimiv.pixbuf_cache import (fit_into, image_cache,
+                                shrink_on_size_prepared)
+from vimiv.prefetch import Prefetcher
 from vimiv.settings import settings
 
 
-class Image(Gtk.Image):
+def _get_time_val(milliseconds):
+    """Return milliseconds as GLib.TimeVal to advance animations by."""
+    time_val = GLib.TimeVal()
+    time_val.tv_sec = milliseconds // 1000
+    time_val.tv_usec = milliseconds % 1000 * 1000
+    return time_val
+
+
+class Image(Gtk.DrawingArea):
     """Image class for vimiv.
 
-    Inherits from Gtk.Image and includes all actions that apply to it.
+    Inherits from Gtk.DrawingArea and includes all actions that apply to it.
+    Instead of scaling the complete image, only the region of the image which
+    is currently visible is drawn using a cairo transformation. Memory and time
+    needed to display an image therefore depend on the window size and not on
+    the zoom level. When fitting an image to the window, it is decoded at the
+    size it is displayed at. The full resolution is only decoded once the image
+    is zoomed past the decoded resolution. Files are read in chunks and shown
+    progressively while they are decoded.
 
     Attributes:
         fit_image:
@@ -26,11 +49,44 @@ class Image(Gtk.Image):
         zoom_percent: Percentage to zoom to compared to the original size.
 
         _app: The main vimiv class to interact with.
+        _forward: If True the last move was forwards. Used for prefetching.
+        _frame_cache: Dictionary of the frames of the played animation scaled
+            to the displayed size. Key: index of the frame; Item: Surface.
+        _frame_cache_bytes: Memory used by the surfaces in _frame_cache.
+        _frame_cache_size: Displayed size of the frames in _frame_cache.
+        _frame_count: Number of frames of the played animation or 0 if it is
+            unknown and frames are not cached.
+        _frame_index: Index of the shown frame of the animation.
+        _frame_time: Milliseconds the animation was played for.
+        _load_pool: ThreadPool with a single worker decoding images.
         _identifier: Used so GUI callbacks are only done if the image is equal
+        _interactive: If True, zoom or resize events arrive in a burst and the
+            image is drawn quickly instead of in high quality.
+        _larger_request: Tuple of (identifier, bound) of the last request to
+            decode the current image at a larger size.
+        _last_zoom_time: Time of the last zoom or resize event.
+        _original_size: Size of the original image as a tuple.
         _pixbuf_iter: Iter of displayed animation.
-        _pixbuf_original: Original image.
+        _pixbuf_original: Original image, possibly decoded at a reduced size.
+        _progress_timer_id: Id of the timer redrawing a partly decoded image.
+        _prefetcher: Prefetcher decoding neighbouring images in the background.
+        _quality_timer_id: Id of the timer starting the high quality render.
+        _scale_id: Used so only the latest high quality render is shown.
+        _scale_pool: ThreadPool with a single worker rendering the image in
+            high quality.
+        _scaled_surface: High quality cairo surface scaled to the displayed
+            size. Only created when shrinking the image.
         _size: Size of the displayed image as a tuple.
+        _surface: Cairo surface of the drawn image.
+        _svg_height: Height at which the shown svg should be rendered.
+        _svg_key: Key of the file from which the rasters in _svg_rasters were
+            rendered as returned by PixbufCache.get_key.
+        _svg_rasters: OrderedDict of the rendered rasters of the shown svg.
+            Key: height; Item: GdkPixbuf.Pixbuf
+        _surface_pixbuf: The pixbuf from which _surface was created.
         _timer_id: Id of current animation timer.
+        _transformations: List of (change, arg) tuples of the rotations and
+            flips applied to the shown image but not to the file.
         _faulty_image: Necessary evil for images that PixbufLoader cannot read.
     """
 
@@ -43,14 +99,45 @@ class Image(Gtk.Image):
         self.fit_image = "overzoom"
         self._pixbuf_iter = GdkPixbuf.PixbufAnimationIter()
         self._pixbuf_original = GdkPixbuf.Pixbuf()
+        self._original_size = (1, 1)
         self.zoom_percent = 1
         self._identifier = 0
         self._size = (1, 1)
         self._timer_id = 0
         self._faulty_image = False
+        self._forward = True
+        self._prefetcher = Prefetcher(app)
+        # Superseded loads are aborted as soon as possible, so one worker
+        # always gets to the most recently requested image quickly
+        self._load_pool = Pool(1)
+        self._surface = None
+        self._surface_pixbuf = None
+        self._interactive = False
+        self._last_zoom_time = 0
+        self._quality_timer_id = 0
+        self._scale_id = 0
+        self._scale_pool = Pool(1)
+        self._scaled_surface = None
+        self._larger_request = None
+        self._progress_timer_id = 0
+        self._transformations = []
+        self._frame_cache = {}
+        self._frame_cache_bytes = 0
+        self._frame_cache_size = (0, 0)
+        self._frame_count = 0
+        self._frame_index = 0
+        self._frame_time = 0
+        self._svg_height = 0
+        self._svg_key = None
+        self._svg_rasters = collections.OrderedDict()
 
         # Connect signals
+        self.add_events(Gdk.EventMask.BUTTON_PRESS_MASK |
+                        Gdk.EventMask.BUTTON_RELEASE_MASK)
+        self.connect("draw", self._on_draw)
         self._app["transform"].connect("changed", self._on_image_changed)
+        self._app["transform"].connect("applied-to-file",
+                                       self._on_transform_applied)
         self._app["commandline"].search.connect("search-completed",
                                                 self._on_search_completed)
         settings.connect("changed", self._on_settings_changed)
@@ -60,21 +147,168 @@ class Image(Gtk.Image):
         if not self._app.get_paths() or self._faulty_image:
             return
         # Scale image
-        pbo_width = self._pixbuf_original.get_width()
-        pbo_height = self._pixbuf_original.get_height()
+        pbo_width, pbo_height = self._original_size
         pbf_width = int(pbo_width * self.zoom_percent)
         pbf_height = int(pbo_height * self.zoom_percent)
+        rescale_svg = settings["rescale_svg"].get_value() \
+            and is_svg(self._app.get_path())
+        # Decode more pixels if the image was zoomed past the decoded size
+        if pbf_width > self._pixbuf_original.get_width() \
+                and self._is_reduced() and not rescale_svg:
+            self._load_larger()
         # Rescaling of svg
-        if is_svg(self._app.get_path()) and settings["rescale_svg"].get_value():
-            pixbuf_final = GdkPixbuf.Pixbuf.new_from_file_at_scale(
-                self._app.get_path(), -1, pbf_height, True)
-        else:
-            pixbuf_final = self._pixbuf_original.scale_simple(
-                pbf_width, pbf_height, GdkPixbuf.InterpType.BILINEAR)
-        self.set_from_pixbuf(pixbuf_final)
+        if rescale_svg:
+            self._show_svg(pbf_height)
+        elif self._surface_pixbuf is not self._pixbuf_original:
+            self._set_surface(self._pixbuf_original)
+        # The scrolled window only needs to know the size, drawing is done in
+        # _on_draw
+        self.set_size_request(pbf_width, pbf_height)
+        self.queue_draw()
         # Update the statusbar
         self._app["statusbar"].update_info()
 
+    def _set_surface(self, pixbuf):
+        """Create the cairo surface which is drawn from pixbuf.
+
+        Args:
+            pixbuf: The GdkPixbuf.Pixbuf to draw.
+        """
+        self._surface = Gdk.cairo_surface_create_from_pixbuf(pixbuf, 1, None)
+        self._surface_pixbuf = pixbuf
+        self._scaled_surface = None
+        self._scale_id += 1
+
+    def _show_svg(self, height):
+        """Show the current svg rendered at height.
+
+        Rendering is done in the loading thread. Meanwhile the cached raster
+        closest to height is drawn scaled.
+
+        Args:
+            height: Height to render the svg at.
+        """
+        key = image_cache.get_key(self._app.get_path())
+        if key != self._svg_key:
+            self._svg_rasters.clear()
+            self._svg_key = key
+        self._svg_height = height
+        if height in self._svg_rasters:
+            pixbuf = self._svg_rasters[height]
+            self._svg_rasters.move_to_end(height)
+        else:
+            self._load_pool.apply_async(
+                self._render_svg, (key, height, self._identifier))
+            if self._svg_rasters:
+                nearest = min(self._svg_rasters,
+                              key=lambda cached: abs(cached - height))
+                pixbuf = self._svg_rasters[nearest]
+            else:
+                pixbuf = self._pixbuf_original
+        if self._surface_pixbuf is not pixbuf:
+            self._set_surface(pixbuf)
+
+    def _render_svg(self, key, height, image_id):
+        # Skip heights zoomed past while waiting
+        if image_id != self._identifier or height != self._svg_height:
+            return
+        try:
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(key[0], -1,
+                                                             height, True)
+        except GLib.GError:
+            return
+        GLib.idle_add(self._set_svg_raster, pixbuf, key, height, image_id)
+
+    def _set_svg_raster(self, pixbuf, key, height, image_id):
+        """Store a rendered svg raster and show it if it is still wanted."""
+        if image_id != self._identifier or key != self._svg_key:
+            return False
+        self._svg_rasters[height] = pixbuf
+        # Rasters are about the size of the window, a few of them are enough
+        # to zoom back and forth without rendering again
+        while len(self._svg_rasters) > 8:
+            self._svg_rasters.popitem(last=False)
+        if height == self._svg_height:
+            self._set_surface(pixbuf)
+            self.queue_draw()
+        return False  # Only run once
+
+    def _on_draw(self, widget, cr):
+        """Draw the visible part of the image.
+
+        Cairo only renders the region given by the clip of cr, so only the
+        part of the image which is visible in the window gets scaled.
+
+        Args:
+            widget: The widget to draw on, self.
+            cr: The cairo context to draw with.
+        """
+        if self._surface is None:
+            return False
+        width, height = self.get_size_request()
+        allocation = self.get_allocation()
+        # Center the image if it is smaller than the available space
+        cr.translate(max(0, (allocation.width - width) // 2),
+                     max(0, (allocation.height - height) // 2))
+        scaled = self._scaled_surface
+        if scaled is not None and scaled.get_width() == width \
+                and scaled.get_height() == height:
+            cr.set_source_surface(scaled, 0, 0)
+        else:
+            cr.scale(width / self._surface.get_width(),
+                     height / self._surface.get_height())
+            cr.set_source_surface(self._surface, 0, 0)
+            # Nearest neighbour is good enough while zooming or resizing
+            cairo_filter = cairo.FILTER_FAST if self._interactive \
+                else cairo.FILTER_GOOD
+            cr.get_source().set_filter(cairo_filter)
+        cr.paint()
+        return False
+
+    def _start_interaction(self):
+        """Draw quickly if zoom or resize events arrive in a burst.
+
+        The high quality render is started once no event arrived for 150 ms.
+        """
+        now = time()
+        self._interactive = now - self._last_zoom_time < 0.15
+        self._last_zoom_time = now
+        self._scale_id += 1
+        if self._quality_timer_id:
+            GLib.source_remove(self._quality_timer_id)
+        self._quality_timer_id = GLib.timeout_add(
+            150, self._on_interaction_finished)
+
+    def _on_interaction_finished(self):
+        """Render the image in high quality after zooming or resizing."""
+        self._quality_timer_id = 0
+        self._interactive = False
+        width, height = self.get_size_request()
+        pixbuf = self._surface_pixbuf
+        window_width, window_height = self._app["window"].get_size()
+        # Shrinking large images with a good filter is slow, scale them in a
+        # thread if the result is not much larger than the window
+        if pixbuf is not None and width < pixbuf.get_width() \
+                and width * height <= 4 * window_width * window_height:
+            self._scale_pool.apply_async(
+                self._scale_thread, (pixbuf, width, height, self._scale_id))
+        self.queue_draw()
+        return False  # Only run once
+
+    def _scale_thread(self, pixbuf, width, height, scale_id):
+        # Skip renders which were superseded while waiting for the worker
+        if scale_id != self._scale_id:
+            return
+        scaled = pixbuf.scale_simple(width, height,
+                                     GdkPixbuf.InterpType.BILINEAR)
+        GLib.idle_add(self._set_scaled_surface, scaled, scale_id)
+
+    def _set_scaled_surface(self, pixbuf, scale_id):
+        if scale_id == self._scale_id:
+            self._scaled_surface = \
+                Gdk.cairo_surface_create_from_pixbuf(pixbuf, 1, None)
+            self.queue_draw()
+
     def zoom_delta(self, zoom_in=True, step=1):
         """Zoom the image by delta percent.
 
@@ -146,6 +380,7 @@ class Image(Gtk.Image):
             delta *= self._app["eventhandler"].num_receive()
         if not forward:
             delta *= -1
+        self._forward = delta >= 0
         self._app.update_index(delta)
         self.fit_image = "overzoom"
 
@@ -164,13 +399,30 @@ class Image(Gtk.Image):
         if self._timer_id:
             self.zoom_percent = 1
             self._pause_gif()
-        # Load file
-        try:
-            self._load(path)
-        except (PermissionError, FileNotFoundError):
-            self._app.remove_path(path)
-            self.move_pos(False)
-            self._app["statusbar"].message("File not accessible", "error")
+        self._clear_frame_cache()
+        self._transformations = []
+        # Show a cached image directly, otherwise load file
+        bound = self.get_decode_bound()
+        pixbuf = image_cache.get(path, bound)
+        if pixbuf:
+            self._identifier += 1
+            self._faulty_image = False
+            self._set_pixbuf_original(pixbuf,
+                                      self._get_original_size(path, pixbuf))
+            self._set_image_pixbuf()
+            self._update()
+            # Prefetched images are shown from the cache, so browsing warms
+            # the thumbnail cache here
+            self._app["thumbnail"].save_thumbnail(path, pixbuf)
+        else:
+            try:
+                self._load(path)
+            except (PermissionError, FileNotFoundError):
+                self._app.remove_path(path)
+                self.move_pos(False)
+                self._app["statusbar"].message("File not accessible", "error")
+                return
+        self._prefetcher.prefetch(self._forward)
 
     def move_pos(self, forward=True, force=False):
         """Move to specific position in paths.
@@ -214,8 +466,7 @@ class Image(Gtk.Image):
             Zoom percentage.
         """
         # Size of the file
-        pbo_width = self._pixbuf_original.get_width()
-        pbo_height = self._pixbuf_original.get_height()
+        pbo_width, pbo_height = self._original_size
         # Maximum size respecting overzoom
         max_width = pbo_width * settings["overzoom"].get_value()
         max_height = pbo_height * settings["overzoom"].get_value()
@@ -241,16 +492,15 @@ class Image(Gtk.Image):
             fallback_zoom: Zoom percentage to fall back to if the zoom
                 percentage is unreasonable.
         """
-        orig_width = self._pixbuf_original.get_width()
-        orig_height = self._pixbuf_original.get_height()
+        orig_width, orig_height = self._original_size
         new_width = orig_width * self.zoom_percent
         new_height = orig_height * self.zoom_percent
         min_width = max(16, orig_width * 0.05)
         min_height = max(16, orig_height * 0.05)
         max_width = min(self._app["window"].get_size()[0] * 10,
-                        self._pixbuf_original.get_width() * 20)
+                        orig_width * 20)
         max_height = min(self._app["window"].get_size()[1] * 10,
-                         self._pixbuf_original.get_height() * 20)
+                         orig_height * 20)
         # Image too small or too large
         if new_height < min_height or new_width < min_width \
                 or new_height > max_height or new_width > max_width:
@@ -260,29 +510,176 @@ class Image(Gtk.Image):
                 self._app["statusbar"].message(message, "warning")
                 self.zoom_percent = fallback_zoom
             return
+        self._start_interaction()
         self._update()
 
+    def get_decode_bound(self, fit=None):
+        """Return the size to decode images at for a fit mode.
+
+        Args:
+            fit: How the image is fitted. Defaults to the current fit_image.
+        Return:
+            Tuple of (width, height) images are shrunk to fit into when
+            decoding or None if they must be decoded in full resolution.
+        """
+        fit = fit if fit else self.fit_image
+        if fit == "user":
+            return None
+        width, height = self._get_available_size()
+        if fit == "horizontal":
+            return width, sys.maxsize
+        elif fit == "vertical":
+            return sys.maxsize, height
+        return width, height
+
+    def _is_reduced(self):
+        """Return True if the image was decoded at a reduced size."""
+        return self._pixbuf_original.get_width() < self._original_size[0]
+
+    def _get_original_size(self, path, pixbuf):
+        """Return the size of the image at path of which pixbuf was decoded.
+
+        Args:
+            path: Path of the image file.
+            pixbuf: The decoded GdkPixbuf.Pixbuf, possibly of reduced size.
+        """
+        info = get_file_info(path)
+        if info is None or info.width < pixbuf.get_width():
+            return pixbuf.get_width(), pixbuf.get_height()
+        return info.width, info.height
+
+    def _set_pixbuf_original(self, pixbuf, original_size=None):
+        """Set the pixbuf of the original image.
+
+        Args:
+            pixbuf: The GdkPixbuf.Pixbuf to set.
+            original_size: Size of the original image if pixbuf was decoded at
+                a reduced size.
+        """
+        self._pixbuf_original = pixbuf
+        self._original_size = original_size if original_size \
+            else (pixbuf.get_width(), pixbuf.get_height())
+
+    def _load_larger(self):
+        """Decode the current image at the displayed or at full resolution.
+
+        Images fitted to the window are decoded at the size of the window,
+        otherwise the full resolution is decoded.
+        """
+        bound = self.get_decode_bound()
+        if bound is not None and fit_into(*self._original_size, bound)[0] \
+                <= self._pixbuf_original.get_width():
+            bound = None
+        # The bound of a rotated image is rotated with respect to the file
+        rotations = sum(arg for change, arg in self._transformations
+                        if change == "rotate")
+        if bound is not None and rotations % 2:
+            bound = bound[::-1]
+        if self._larger_request == (self._identifier, bound):
+            return
+        self._larger_request = (self._identifier, bound)
+        self._load_pool.apply_async(
+            self._load_larger_thread,
+            (self._app.get_path(), bound, self._identifier))
+
+    def _load_larger_thread(self, path, bound, image_id):
+        if image_id != self._identifier:
+            return
+        # Stop decoding if another image was requested meanwhile
+        try:
+            pixbuf = image_cache.load(
+                path, bound, cancelled=lambda: image_id != self._identifier)
+        except (GLib.GError, OSError):
+            return
+        if pixbuf is not None:
+            GLib.idle_add(self._set_larger_pixbuf, pixbuf, image_id)
+
+    def _set_larger_pixbuf(self, pixbuf, image_id):
+        """Replace the shown image by the larger pixbuf.
+
+        Args:
+            pixbuf: The newly decoded GdkPixbuf.Pixbuf.
+            image_id: Identifier of the image the pixbuf was decoded for.
+        """
+        for change, arg in self._transformations:
+            pixbuf = self._transform_pixbuf(pixbuf, change, arg)
+        if image_id == self._identifier \
+                and pixbuf.get_width() > self._pixbuf_original.get_width():
+            self._pixbuf_original = pixbuf
+            self._update()
+        return False  # Only run once
+
     def _play_gif(self):
         """Run the animation of a gif."""
-        self._pixbuf_original = self._pixbuf_iter.get_pixbuf()
-        GLib.idle_add(self._update)
-        if self._pixbuf_iter.advance():
+        self._show_frame(self._pixbuf_iter.get_pixbuf())
+        # Advance by exactly the shown frame instead of the time passed, so
+        # no frame is skipped and the index of the next one is known
+        self._frame_time += max(self._pixbuf_iter.get_delay_time(), 0)
+        if self._pixbuf_iter.advance(_get_time_val(self._frame_time)):
             # Clear old timer
             if self._timer_id:
                 GLib.source_remove(self._timer_id)
             # Add new timer if the gif is not static
             delay = self._pixbuf_iter.get_delay_time()
+            if delay >= 0 and self._frame_count:
+                self._frame_index = (self._frame_index + 1) % self._frame_count
+            else:  # Stopped at a frame which is not loaded yet or finished
+                self._frame_count = 0
             self._timer_id = GLib.timeout_add(delay, self._play_gif) \
                 if delay >= 0 else 0
 
+    def _show_frame(self, pixbuf):
+        """Show a frame of an animation scaled to the displayed size.
+
+        Scaled frames are cached, so after the first loop playing the
+        animation only paints them.
+
+        Args:
+            pixbuf: The GdkPixbuf.Pixbuf of the frame.
+        """
+        self._set_pixbuf_original(pixbuf)
+        if not self._app.get_paths() or self._faulty_image:
+            return
+        width = int(pixbuf.get_width() * self.zoom_percent)
+        height = int(pixbuf.get_height() * self.zoom_percent)
+        # Frames cached at a different zoom level are useless
+        if (width, height) != self._frame_cache_size:
+            self._clear_frame_cache()
+            self._frame_cache_size = (width, height)
+        surface = self._frame_cache.get(self._frame_index)
+        if surface is None:
+            if (width, height) != (pixbuf.get_width(), pixbuf.get_height()):
+                pixbuf = pixbuf.scale_simple(width, height,
+                                             GdkPixbuf.InterpType.BILINEAR)
+            surface = Gdk.cairo_surface_create_from_pixbuf(pixbuf, 1, None)
+            size = width * height * 4
+            budget = settings["image_cache_mb"].get_value() * 1024 * 1024
+            # Frames which are still loading are incomplete
+            if self._frame_count \
+                    and not self._pixbuf_iter.on_currently_loading_frame() \
+                    and self._frame_cache_bytes + size <= budget:
+                self._frame_cache[self._frame_index] = surface
+                self._frame_cache_bytes += size
+        self._surface = surface
+        self._surface_pixbuf = self._pixbuf_original
+        self._scaled_surface = surface
+        # Renders of earlier frames must not replace this one
+        self._scale_id += 1
+        self.set_size_request(width, height)
+        self.queue_draw()
+
+    def _clear_frame_cache(self):
+        self._frame_cache.clear()
+        self._frame_cache_bytes = 0
+
     def _pause_gif(self):
         """Pause a gif or show initial image."""
         if self._timer_id:
             GLib.source_remove(self._timer_id)
             self._timer_id = 0
         else:
-            image = self._pixbuf_iter.get_pixbuf()
-            self.set_from_pixbuf(image)
+            self._set_pixbuf_original(self._pixbuf_iter.get_pixbuf())
+            self._update()
 
     def _get_available_size(self):
         """Receive size not occupied by other Widgets.
@@ -305,48 +702,130 @@ class Image(Gtk.Image):
         """Actual implementation to load an image from path."""
         loader = GdkPixbuf.PixbufLoader()
         self._identifier += 1
-        if is_animation(path):
-            loader.connect("area-prepared", self._set_image_anim)
+        self._faulty_image = False
+        animation = is_animation(path)
+        bound = None
+        if animation:
+            loader.connect("area-prepared", self._set_image_anim, path,
+                           self._identifier)
         else:
-            loader.connect("area-prepared", self._set_image_pixbuf)
-            loader.connect("closed",
-                           self._finish_image_pixbuf, self._identifier)
-        load_thread = Thread(target=self._load_thread, args=(loader, path),
-                             daemon=True)
-        # Daemon is set to True so the program can exit with "q" immediately if
-        # only a loading thread is left
-        load_thread.start()
-
-    def _load_thread(self, loader, path):
+            bound = self.get_decode_bound()
+            loader.connect("size-prepared", self._on_size_prepared, bound,
+                           self._identifier)
+            loader.connect("area-prepared", self._on_area_prepared,
+                           self._identifier)
+            loader.connect("area-updated", self._on_area_updated,
+                           self._identifier)
+        self._load_pool.apply_async(
+            self._load_thread,
+            (loader, path, self._identifier, animation, bound))
+
+    def _load_thread(self, loader, path, image_id, animation, bound):
         # The try ... except wrapper and the _faulty_image attribute are used to
         # catch weird images that break GdkPixbufLoader but work otherwise
         # See https://github.com/karlch/vimiv/issues/49 for more information
         try:
-            self._faulty_image = True
+            # Stream the file so progressive images are shown while reading
+            # and the complete file is never held in memory
             with open(path, "rb") as f:
-                image_bytes = f.read()
-                loader.write(image_bytes)
-            self._faulty_image = False
+                for chunk in iter(lambda: f.read(64 * 1024), b""):
+                    # Stop decoding if another image was requested meanwhile
+                    if image_id != self._identifier:
+                        self._abort_load(loader)
+                        return
+                    loader.write(chunk)
             loader.close()
+            pixbuf = loader.get_pixbuf()
+            if pixbuf is not None:
+                # Only completely decoded pixbufs are cached, animations are
+                # not cached at all
+                if not animation:
+                    self._finish_image_pixbuf(pixbuf, image_id, path, bound)
+                # Writing the thumbnail now saves decoding the file again later
+                self._app["thumbnail"].save_thumbnail(path, pixbuf)
         except GLib.GError:
-            self._pixbuf_original = GdkPixbuf.Pixbuf.new_from_file(path)
+            if image_id != self._identifier:
+                return
+            self._faulty_image = True
+            self._set_pixbuf_original(image_cache.load(path))
             self._faulty_image = False
             self._set_image_pixbuf()
             GLib.idle_add(self._update)
 
+    @staticmethod
+    def _abort_load(loader):
+        """Close the loader of a superseded image discarding its pixbuf."""
+        try:
+            loader.close()
+        except GLib.GError:
+            pass  # Partly decoded images are incomplete
+
+    def _on_size_prepared(self, loader, width, height, bound, image_id):
+        """Decode images which are fitted to the window at the displayed size.
+
+        Args:
+            loader: The GdkPixbuf.PixbufLoader decoding the image.
+            width: Width of the original image.
+            height: Height of the original image.
+            bound: Size to shrink the image to fit into or None.
+            image_id: Identifier of the image the loader decodes.
+        """
+        shrink_on_size_prepared(loader, width, height, bound)
+        # Superseded loads must not overwrite the state of the current image
+        if image_id == self._identifier:
+            self._original_size = (width, height)
+
+    def _on_area_prepared(self, loader, image_id):
+        """Show the image as soon as the loader allocated its pixbuf."""
+        if image_id == self._identifier:
+            self._set_image_pixbuf(loader)
+
     def _set_image_pixbuf(self, loader=None):
         if loader:
             self._pixbuf_original = loader.get_pixbuf()
         self._size = self._get_available_size()
         self.zoom_percent = self.get_zoom_percent_to_fit(self.fit_image)
 
-    def _finish_image_pixbuf(self, loader, image_id):
+    def _on_area_updated(self, loader, x, y, width, height, image_id):
+        """Redraw a partly decoded image at most every 100 ms.
+
+        Called from the loading thread whenever new pixels were decoded.
+        """
+        if not self._progress_timer_id:
+            self._progress_timer_id = GLib.timeout_add(
+                100, self._refresh_surface, image_id)
+
+    def _refresh_surface(self, image_id):
+        """Recreate the surface after the pixels of the pixbuf changed."""
+        self._progress_timer_id = 0
         if self._identifier == image_id:
-            GLib.idle_add(self._update)
+            self._surface_pixbuf = None
+            self._update()
+        return False  # Only run once
+
+    def _finish_image_pixbuf(self, pixbuf, image_id, path, bound):
+        """Cache the completely decoded pixbuf and redraw it.
+
+        Args:
+            pixbuf: The decoded GdkPixbuf.Pixbuf.
+            image_id: Identifier of the image the pixbuf was decoded for.
+            path: Path of the decoded image.
+            bound: Bounding size the image was shrunk to fit into.
+        """
+        # Keep the unmodified pixbuf around so moving back is instant
+        image_cache.put(path, pixbuf, bound)
+        if self._identifier == image_id:
+            # The surface may show a partly decoded pixbuf
+            GLib.idle_add(self._refresh_surface, image_id)
 
-    def _set_image_anim(self, loader):
-        self._pixbuf_iter = loader.get_animation().get_iter()
-        self._pixbuf_original = self._pixbuf_iter.get_pixbuf()
+    def _set_image_anim(self, loader, path, image_id):
+        if image_id != self._identifier:
+            return
+        self._frame_count = get_frame_count(path)
+        self._frame_index = 0
+        self._frame_time = 0
+        self._pixbuf_iter = loader.get_animation().get_iter(_get_time_val(0))
+        self._set_pixbuf_original(self._pixbuf_iter.get_pixbuf())
         self._size = self._get_available_size()
         self.zoom_percent = self.get_zoom_percent_to_fit(self.fit_image)
         if settings["play_animations"].get_value():
@@ -354,11 +833,20 @@ class Image(Gtk.Image):
             self._timer_id = GLib.timeout_add(delay, self._play_gif) \
                 if delay >= 0 else 0
 
+    def get_pixbuf(self):
+        """Return the pixbuf which is drawn or None if nothing is drawn."""
+        return self._surface_pixbuf
+
     def get_pixbuf_original(self):
+        """Return a copy of the original image in full resolution."""
+        if self._is_reduced():
+            self._larger_request = (self._identifier, None)
+            self._set_larger_pixbuf(image_cache.load(self._app.get_path()),
+                                    self._identifier)
         return self._pixbuf_original.copy()
 
     def set_pixbuf(self, pixbuf):
-        self._pixbuf_original = pixbuf
+        self._set_pixbuf_original(pixbuf)
         self._update()
 
     def _on_image_changed(self, transform, change, arg):
@@ -369,16 +857,34 @@ class Image(Gtk.Image):
             change: The type of transformation.
             arg: Argument for the transformation, e.g. cwise for rotate.
         """
-        if change == "rotate":
-            self._pixbuf_original = \
-                self._pixbuf_original.rotate_simple(90 * arg)
-        elif change == "flip":
-            self._pixbuf_original = self._pixbuf_original.flip(arg)
+        self._pixbuf_original = \
+            self._transform_pixbuf(self._pixbuf_original, change, arg)
+        if change == "rotate" and arg % 2:
+            self._original_size = self._original_size[::-1]
+        self._transformations.append((change, arg))
         if self.fit_image != "user":
             self.zoom_to(0, self.fit_image)
         else:
             self._update()
 
+    @staticmethod
+    def _transform_pixbuf(pixbuf, change, arg):
+        """Return pixbuf rotated or flipped according to a transformation.
+
+        Args:
+            pixbuf: The GdkPixbuf.Pixbuf to transform.
+            change: The type of transformation.
+            arg: Argument for the transformation, e.g. cwise for rotate.
+        """
+        if change == "rotate":
+            return pixbuf.rotate_simple(90 * arg)
+        return pixbuf.flip(arg)
+
+    def _on_transform_applied(self, transform, files):
+        # The file now contains all transformations of the shown image
+        if self._app.get_paths() and self._app.get_path() in files:
+            self._transformations = []
+
     def _on_search_completed(self, search, new_pos, last_focused):
         if last_focused == "im":
             self._app["eventhandler"].set_num_str(new_pos + 1)
@@ -4,8 +4,9 @@
 import os
 from multiprocessing.pool import ThreadPool as Pool
 
-from gi.repository import GdkPixbuf, GObject
-from vimiv.fileactions import edit_supported
+from gi.repository import GLib, GObject
+from vimiv.fileactions import edit_supported, get_file_info
+from vimiv.pixbuf_cache import image_cache
 
 # We need the try ... except wrapper here
 # pylint: disable=ungrouped-imports
@@ -31,8 +32,7 @@ def save_pixbuf(pixbuf, filename, update_orientation_tag=False):
     if not os.path.isfile(filename):
         raise FileNotFoundError("Original file to retrieve data from not found")
     # Get needed information
-    info = GdkPixbuf.Pixbuf.get_file_info(filename)[0]
-    extension = info.get_extensions()[0]
+    extension = get_file_info(filename).extensions[0]
     if _has_exif:
         exif = GExiv2.Metadata(filename)
     # Save
@@ -40,7 +40,31 @@ def save_pixbuf(pixbuf, filename, update_orientation_tag=False):
     if _has_exif and exif.get_supports_exif():
         if update_orientation_tag:
             exif.set_orientation(GExiv2.Orientation.NORMAL)
+        # The embedded thumbnail shows the old pixels
+        exif.erase_exif_thumbnail()
         exif.save_file()
+    # The cached image is outdated now
+    image_cache.remove(filename)
+
+
+def get_orientation(filename):
+    """Return the exif orientation of an image.
+
+    Args:
+        filename: Name of the image.
+    Return:
+        The orientation as integer from 1 to 8 or 0 if it cannot be read.
+    """
+    if not _has_exif:
+        return 0
+    try:
+        exif = GExiv2.Metadata(filename)
+    except GLib.Error:
+        return 0
+    if not exif.get_supports_exif():
+        return GExiv2.Orientation.NORMAL
+    # Images without orientation are shown unchanged
+    return int(exif.get_orientation()) or int(GExiv2.Orientation.NORMAL)
 
 
 def rotate_file(filename, cwise):
@@ -50,7 +74,7 @@ def rotate_file(filename, cwise):
         filename: Name of the image to rotate.
         cwise: Rotate image 90 * cwise degrees.
     """
-    pixbuf = GdkPixbuf.Pixbuf.new_from_file(filename)
+    pixbuf = image_cache.load(filename, store=False)
     pixbuf = pixbuf.rotate_simple(90 * cwise)
     save_pixbuf(pixbuf, filename, update_orientation_tag=True)
 
@@ -62,7 +86,7 @@ def flip_file(filename, horizontal):
         filename: Name of the image to flip.
         horizontal: If True, flip horizontally. Else vertically.
     """
-    pixbuf = GdkPixbuf.Pixbuf.new_from_file(filename)
+    pixbuf = image_cache.load(filename, store=False)
     pixbuf = pixbuf.flip(horizontal)
     save_pixbuf(pixbuf, filename)
 
@@ -111,7 +135,8 @@ class Autorotate(GObject.Object):
         orientation = exif.get_orientation()
         if orientation not in [GExiv2.Orientation.NORMAL,
                                GExiv2.Orientation.UNSPECIFIED]:
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file(filename)
+            # Do not flush the cache with all images of the filelist
+            pixbuf = image_cache.load(filename, store=False)
             pixbuf = pixbuf.apply_embedded_orientation()
             save_pixbuf(pixbuf, filename, update_orientation_tag=True)
             self._rotated_count += 1
@@ -0,0 +1,243 @@
+# vim: ft=python fileencoding=utf-8 sw=4 et sts=4
+"""Provides a memory limited cache of decoded images shared by all of vimiv.
+
+Decoding large images is expensive, so everything that reads image files
+should go through the shared image_cache. Entries are keyed on path,
+modification time and size of the file, so edited files are never served from
+the cache. Images can also be stored shrunk to fit into a bounding size, e.g.
+the window, which is much faster to decode for large images.
+"""
+
+import collections
+import os
+from threading import Lock
+
+from gi.repository import GdkPixbuf, GLib
+from vimiv.fileactions import get_file_info
+from vimiv.settings import settings
+
+
+def fit_into(width, height, bound):
+    """Return the size of an image shrunk to fit into bound.
+
+    Args:
+        width: Width of the image.
+        height: Height of the image.
+        bound: Tuple of (width, height) the image should fit into or None.
+    Return:
+        Tuple of the new (width, height) keeping the aspect ratio. Images which
+        already fit are not changed, shrunk images touch the edge of bound.
+    """
+    if bound is None or (width <= bound[0] and height <= bound[1]):
+        return width, height
+    if bound[0] / width < bound[1] / height:
+        return bound[0], max(1, round(height * bound[0] / width))
+    return max(1, round(width * bound[1] / height)), bound[1]
+
+
+def shrink_on_size_prepared(loader, width, height, bound):
+    """Shrink the image of a PixbufLoader to fit into bound while decoding.
+
+    Used as callback for the size-prepared signal of GdkPixbuf.PixbufLoader.
+    """
+    new_size = fit_into(width, height, bound)
+    if new_size != (width, height):
+        loader.set_size(*new_size)
+
+
+def decode(path, bound=None, cancelled=None):
+    """Decode the image at path.
+
+    Args:
+        path: Path of the image to decode.
+        bound: Tuple of (width, height). If given, larger images are shrunk to
+            fit into it during decoding.
+        cancelled: Function called between reading chunks of the file.
+            Decoding stops if it returns True.
+    Return:
+        The decoded GdkPixbuf.Pixbuf or None if decoding was cancelled. Raises
+        GLib.GError if decoding fails.
+    """
+    if bound is None and cancelled is None:
+        return GdkPixbuf.Pixbuf.new_from_file(path)
+    loader = GdkPixbuf.PixbufLoader()
+    loader.connect("size-prepared", shrink_on_size_prepared, bound)
+    try:
+        # Stream the file so the complete file is never held in memory
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                if cancelled is not None and cancelled():
+                    try:
+                        loader.close()
+                    except GLib.GError:
+                        pass  # Partly decoded images are incomplete
+                    return None
+                loader.write(chunk)
+        loader.close()
+    # Some images break GdkPixbufLoader but work otherwise, see
+    # https://github.com/karlch/vimiv/issues/49
+    except GLib.GError:
+        return GdkPixbuf.Pixbuf.new_from_file(path)
+    return loader.get_pixbuf()
+
+
+class PixbufCache(object):
+    """Least recently used cache of pixbufs limited by the memory they use.
+
+    Attributes:
+        _budget_setting: Name of the setting defining the budget in MiB.
+        _entries: OrderedDict of cached pixbufs, least recently used first.
+            Key: (path, mtime, size, bound); Item: GdkPixbuf.Pixbuf
+            bound is None for images decoded in full resolution. Only one
+            shrunk pixbuf is kept per path.
+        _lock: Lock as the cache is accessed from loading threads.
+        _used: Amount of bytes used by the cached pixbufs.
+    """
+
+    def __init__(self, budget_setting):
+        """Create an empty cache.
+
+        Args:
+            budget_setting: Name of the setting defining the budget in MiB.
+        """
+        self._budget_setting = budget_setting
+        self._entries = collections.OrderedDict()
+        self._lock = Lock()
+        self._used = 0
+
+    @staticmethod
+    def get_key(path):
+        """Return the key of path or None if the file cannot be accessed.
+
+        Args:
+            path: Path of the image file.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return path, stat.st_mtime_ns, stat.st_size
+
+    def get(self, path, bound=None):
+        """Return the cached pixbuf of path or None if there is none.
+
+        Args:
+            path: Path of the image to receive.
+            bound: Receive the image shrunk to fit into this bounding size. The
+                full resolution image is returned if it is cached instead.
+        """
+        key = self._get_entry_key(path, bound)
+        if key is None:
+            return None
+        with self._lock:
+            for key in [key, key[:3] + (None,)]:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key]
+        return None
+
+    def put(self, path, pixbuf, bound=None):
+        """Store a decoded pixbuf evicting least recently used ones if needed.
+
+        Args:
+            path: Path of the image the pixbuf was decoded from.
+            pixbuf: The decoded GdkPixbuf.Pixbuf.
+            bound: Bounding size the pixbuf was shrunk to fit into.
+        """
+        if bound is not None and self._is_unshrunk(path, pixbuf, bound):
+            bound = None
+        key = self._get_entry_key(path, bound)
+        if key is None:
+            return
+        budget = settings[self._budget_setting].get_value() * 1024 * 1024
+        size = pixbuf.get_byte_length()
+        # Pixbufs larger than the whole budget would only flush the cache
+        if size > budget:
+            return
+        with self._lock:
+            self._remove_outdated(key)
+            self._entries[key] = pixbuf
+            self._used += size
+            while self._used > budget:
+                _, evicted = self._entries.popitem(last=False)
+                self._used -= evicted.get_byte_length()
+
+    def load(self, path, bound=None, store=True, cancelled=None):
+        """Return the pixbuf of path decoding the file if it is not cached.
+
+        Args:
+            path: Path of the image to load.
+            bound: Load the image shrunk to fit into this bounding size.
+            store: If True, store a newly decoded pixbuf in the cache.
+            cancelled: Function to stop decoding early, see decode.
+        Return:
+            The GdkPixbuf.Pixbuf or None if decoding was cancelled. Raises
+            GLib.GError if decoding fails.
+        """
+        pixbuf = self.get(path, bound)
+        if pixbuf is None:
+            pixbuf = decode(path, bound, cancelled)
+            if store and pixbuf is not None:
+                self.put(path, pixbuf, bound)
+        return pixbuf
+
+    def remove(self, path):
+        """Remove all pixbufs of path from the cache.
+
+        Args:
+            path: Path of the image to remove.
+        """
+        with self._lock:
+            self._remove_path(path)
+
+    def clear(self):
+        """Remove all pixbufs from the cache."""
+        with self._lock:
+            self._entries.clear()
+            self._used = 0
+
+    def get_used_bytes(self):
+        """Return the amount of bytes used by the cached pixbufs."""
+        return self._used
+
+    @staticmethod
+    def _is_unshrunk(path, pixbuf, bound):
+        """Check whether pixbuf fitting into bound has the size of the image.
+
+        Images which fit into bound are not shrunk, see fit_into. Shrunk images
+        touch the edge of bound, as do images which fit into it exactly, so
+        only then the size of the file has to be read.
+        """
+        width, height = pixbuf.get_width(), pixbuf.get_height()
+        if width > bound[0] or height > bound[1]:
+            return False
+        if width < bound[0] and height < bound[1]:
+            return True
+        info = get_file_info(path)
+        return info is not None and (info.width, info.height) == (width,
+                                                                  height)
+
+    def _get_entry_key(self, path, bound):
+        key = self.get_key(path)
+        return key + (bound,) if key is not None else None
+
+    def _remove_path(self, path):
+        """Remove all entries of path, the lock must be held by the caller."""
+        for key in [key for key in self._entries if key[0] == path]:
+            self._used -= self._entries.pop(key).get_byte_length()
+
+    def _remove_outdated(self, new_key):
+        """Remove entries replaced by new_key, the caller must hold the lock.
+
+        These are all entries of the same path created from an older file and
+        the entry of the same path with the same kind of bound.
+        """
+        for key in list(self._entries.keys()):
+            if key[0] == new_key[0] and (key[1:3] != new_key[1:3] or
+                                         (key[3] is None) is
+                                         (new_key[3] is None)):
+                self._used -= self._entries.pop(key).get_byte_length()
+
+
+# Cache of decoded images shared by image, prefetch and transformations
+image_cache = PixbufCache("image_cache_mb")
@@ -0,0 +1,95 @@
+# vim: ft=python fileencoding=utf-8 sw=4 et sts=4
+"""Decode the images next to the currently displayed one in the background."""
+
+from multiprocessing.pool import ThreadPool as Pool
+from threading import Lock
+
+from gi.repository import GLib
+from vimiv.fileactions import is_animation
+from vimiv.pixbuf_cache import image_cache
+from vimiv.settings import settings
+
+
+class Prefetcher(object):
+    """Decodes neighbouring images in the background so moving is instant.
+
+    The amount of images decoded in each direction is defined by the
+    prefetch_count setting. Images in the direction of navigation are decoded
+    first. Decoded images are stored in the shared image_cache at the size
+    they are displayed at when moving to them.
+
+    Attributes:
+        _app: The main vimiv application to interact with.
+        _bound: Size images are shrunk to fit into when decoding.
+        _lock: Lock protecting _wanted across threads.
+        _thread_pool: ThreadPool with a single worker to decode images.
+        _wanted: List of paths which should currently be prefetched.
+    """
+
+    def __init__(self, app):
+        """Create the necessary objects.
+
+        Args:
+            app: The main vimiv application to interact with.
+        """
+        self._app = app
+        self._bound = None
+        self._lock = Lock()
+        self._wanted = []
+        # One worker is enough as the neighbours are only needed one by one and
+        # we do not want to compete with loading the current image
+        self._thread_pool = Pool(1)
+
+    def get(self, path):
+        """Return the prefetched pixbuf of path or None if there is none.
+
+        Args:
+            path: Path of the image to receive.
+        """
+        return image_cache.get(path, self._bound)
+
+    def prefetch(self, forward=True):
+        """Start decoding the neighbours of the current image.
+
+        Args:
+            forward: If True the user is moving forwards, so the next images
+                are decoded before the previous ones.
+        """
+        paths = self._app.get_paths()
+        if not paths:
+            return
+        count = settings["prefetch_count"].get_value()
+        wanted = []
+        direction = 1 if forward else -1
+        for sign in [direction, -direction]:
+            for step in range(1, count + 1):
+                index = self._app.get_index() + sign * step
+                # Shuffle reorders the paths on wrap-around, so anything beyond
+                # the end is unknown
+                if settings["shuffle"].get_value() \
+                        and not 0 <= index < len(paths):
+                    break
+                path = paths[index % len(paths)]
+                if path not in wanted and path != self._app.get_path():
+                    wanted.append(path)
+        with self._lock:
+            self._wanted = wanted
+        # Moving to an image always fits it to the window
+        self._bound = self._app["image"].get_decode_bound("overzoom")
+        for path in wanted:
+            if self.get(path) is None:
+                self._thread_pool.apply_async(self._decode,
+                                              (path, self._bound))
+
+    def _decode(self, path, bound):
+        """Decode path in the thread pool if it is still wanted."""
+        with self._lock:
+            if path not in self._wanted:
+                return
+        # Animations are played using their own iter
+        if is_animation(path):
+            return
+        try:
+            image_cache.load(path, bound)
+        except (GLib.GError, OSError):
+            return
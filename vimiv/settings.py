@@ -227,6 +227,11 @@ class SettingStorage(GObject.Object):
             IntSetting("thumb_padding", 10),
             IntSetting("completion_height", 200),
             BoolSetting("play_animations", True),
+            IntSetting("prefetch_count", 1),
+            IntSetting("image_cache_mb", 256),
+            IntSetting("thumbnail_cache_mb", 64),
+            IntSetting("thumbnail_disk_mb", 1024),
+            BoolSetting("thumbnail_gc_on_start", False),
             BoolSetting("start_show_library", False),
             IntSetting("library_width", 300),
             BoolSetting("expand_lib", True),
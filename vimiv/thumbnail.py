@@ -3,8 +3,10 @@
 
 import os
 from math import floor
+from threading import Thread
 
 from gi.repository import GdkPixbuf, GLib, Gtk
+from vimiv.pixbuf_cache import PixbufCache
 from vimiv.settings import settings
 from vimiv.thumbnail_manager import ThumbnailManager
 
@@ -18,12 +20,25 @@ class Thumbnail(Gtk.IconView):
         toggled: If True, thumbnail mode is open.
 
         _app: The main vimiv application to interact with.
+        _centred_pos: Position the view was last centred on.
+        _default_pixbuf: Placeholder shown for thumbnails outside the window.
+        _gc_thread: Thread cleaning up the thumbnail cache.
+        _finished: Set of positions of created thumbnails which are not yet in
+            the liststore.
+        _flush_id: ID of the tick callback adding _finished to the liststore.
         _last_focused: Widget that was focused before thumbnail.
         _liststore: Gtk.ListStore containing thumbnail pixbufs and names.
         _markup: Markup string used to highlight search results.
+        _requested: Dictionary of the file keys of requested thumbnails as
+            returned by PixbufCache.get_key. Key: position; Item: file key
+        _scaled: Dictionary of the thumbnails scaled to the zoom levels.
+            Key: position; Item: (file key, dictionary of pixbufs by size)
         _thumbnail_manager: ThumbnailManager class to create and receive
             thumbnail files.
         _timer_id: ID of the currently running GLib.Timeout.
+        _vadjustment: Vertical Gtk.Adjustment of the view connected to.
+        _window: Tuple of the first and the position after the last one whose
+            thumbnails are kept in the liststore.
         _zoom_levels: List of tuples containing the possible thumbnail sizes.
         _zoom_level_index: Position in the possible_sizes list.
     """
@@ -62,8 +77,18 @@ class Thumbnail(Gtk.IconView):
         self.set_item_padding(padding)
         self.last_focused = ""
         self._thumbnail_manager = ThumbnailManager()
+        self._vadjustment = None
+        self._centred_pos = -1
+        self._finished = set()
+        self._flush_id = 0
+        self._default_pixbuf = None
+        self._requested = {}
+        self._scaled = {}
+        self._window = (0, 0)
+        self._gc_thread = None
 
         # Signals
+        self.connect("notify::vadjustment", self._on_vadjustment_set)
         self._app["mark"].connect("marks-changed", self._on_marks_changed)
         self._app["transform"].connect("applied-to-file",
                                        self._on_transformations_applied_to_file)
@@ -133,7 +158,9 @@ class Thumbnail(Gtk.IconView):
         Args:
             toggled: If True thumbnail mode is already toggled.
         """
-        # Clean liststore
+        # Filling the liststore without a connected view avoids updating the
+        # layout for every single row
+        self.set_model(None)
         self._liststore.clear()
 
         # Draw the icon view instead of the image
@@ -143,14 +170,23 @@ class Thumbnail(Gtk.IconView):
         super(Thumbnail, self).show()
         self.toggled = True
 
-        # Add initial placeholder for all thumbnails
+        # Add thumbnails of unchanged files directly and an initial
+        # placeholder for all others, the thumbnails around the cursor are
+        # then requested by move_to_pos
+        self._thumbnail_manager.scheduler.clear()
+        self._requested.clear()
+        self._window = (0, 0)
         default_pixbuf = self._get_default_pixbuf()
-        for path in self._app.get_paths():
+        size = self.get_zoom_level()[0]
+        for position, path in enumerate(self._app.get_paths()):
             name = self._get_name(path)
-            self._liststore.append([default_pixbuf, name])
-
-        # Generate thumbnails asynchronously
-        self.reload_all(ignore_cache=True)
+            key, scaled = self._scaled.get(position, (None, {}))
+            if size in scaled and key == PixbufCache.get_key(path):
+                self._liststore.append([scaled[size], name])
+            else:
+                self._scaled.pop(position, None)
+                self._liststore.append([default_pixbuf, name])
+        self.set_model(self._liststore)
 
         # Set columns
         self.calculate_columns()
@@ -176,26 +212,57 @@ class Thumbnail(Gtk.IconView):
         self.set_columns(columns)
 
     def _get_default_pixbuf(self):
-        default_pixbuf_max = GdkPixbuf.Pixbuf.new_from_file_at_scale(
-            self._thumbnail_manager.default_icon, *self.get_zoom_level(), True)
         size = self.get_zoom_level()[0]
-        return self._thumbnail_manager.scale_pixbuf(default_pixbuf_max, size)
+        if self._default_pixbuf is None or max(
+                self._default_pixbuf.get_width(),
+                self._default_pixbuf.get_height()) != size:
+            default_pixbuf_max = GdkPixbuf.Pixbuf.new_from_file_at_scale(
+                self._thumbnail_manager.default_icon, *self.get_zoom_level(),
+                True)
+            self._default_pixbuf = self._thumbnail_manager.scale_pixbuf(
+                default_pixbuf_max, size)
+        return self._default_pixbuf
+
+    def _request_thumbnail(self, path, position, ignore_cache=False):
+        """Create the thumbnail of path scaled to all zoom levels."""
+        self._requested[position] = PixbufCache.get_key(path)
+        self._thumbnail_manager.get_thumbnail_at_scale_async(
+            path, self.get_zoom_level()[0], self._on_thumbnail_created,
+            position, ignore_cache=ignore_cache,
+            sizes=[level[0] for level in self._zoom_levels])
+
+    def _on_thumbnail_created(self, scaled, position):
+        key = self._requested.pop(position, None)
+        # The position left the window while the thumbnail was created
+        if not self._window[0] <= position < self._window[1]:
+            return
+        # Collect thumbnails and add them to the liststore once per frame
+        self._scaled[position] = (key, scaled)
+        self._finished.add(position)
+        if not self._flush_id:
+            if self.get_mapped():
+                self._flush_id = self.add_tick_callback(self._flush_finished)
+            else:
+                self._flush_finished()
 
-    def reload_all(self, ignore_cache=False):
+    def _flush_finished(self, *args):
+        """Add all created thumbnails to the liststore."""
+        self._flush_id = 0
+        finished, self._finished = self._finished, set()
         size = self.get_zoom_level()[0]
-        for i, path in enumerate(self._app.get_paths()):
-            self._thumbnail_manager.get_thumbnail_at_scale_async(
-                path, size, self._on_thumbnail_created, i,
-                ignore_cache=ignore_cache)
-
-    def _on_thumbnail_created(self, pixbuf, position):
-        # Happens if files are deleted while we are trying to create thumbnails
-        # for them
-        if len(self._liststore) > position:
-            # Subscripting the liststore directly works fine
-            # pylint: disable=unsubscriptable-object
-            self._liststore[position][0] = pixbuf
+        for position in finished:
+            # Not scaled to the current size if the zoom level changed while
+            # the thumbnail was created, a new request is pending then
+            pixbuf = self._get_scaled(position).get(size)
+            # Happens if files are deleted while we are trying to create
+            # thumbnails for them
+            if pixbuf is not None and len(self._liststore) > position:
+                # Subscripting the liststore directly works fine
+                # pylint: disable=unsubscriptable-object
+                self._liststore[position][0] = pixbuf
+        if self.get_position() != self._centred_pos:
             self.move_to_pos(self.get_position())
+        return False  # Only run once
 
     def _get_name(self, filename):
         name = os.path.splitext(os.path.basename(filename))[0]
@@ -204,26 +271,30 @@ class Thumbnail(Gtk.IconView):
 
         return name
 
-    def reload(self, filename, reload_image=True):
+    def reload(self, filename, reload_image=True, ignore_cache=True):
         """Reload the thumbnails of manipulated images.
 
         Args:
             filename: Name of the file to reload thumbnail of.
             reload_image: If True reload the image of the thumbnail. Else only
                 the name (useful for marking).
+            ignore_cache: If True create the thumbnail file again.
         """
         index = self._app.get_paths().index(filename)
+        self._reload_position(index, filename, reload_image, ignore_cache)
+
+    def _reload_position(self, index, filename, reload_image,
+                         ignore_cache=True):
         name = self._get_name(filename)
         if os.path.basename(filename) \
                 in self._app["commandline"].search.results:
             name = self._markup + "<b>" + name + "</b></span>"
 
-        # pylint: disable=unsubscriptable-object
-        if reload_image:
-            self._thumbnail_manager.get_thumbnail_at_scale_async(
-                filename, self.get_zoom_level()[0],
-                self._on_thumbnail_created, index, ignore_cache=True)
+        # Thumbnails outside the window are requested when entering it
+        if reload_image and self._window[0] <= index < self._window[1]:
+            self._request_thumbnail(filename, index, ignore_cache)
 
+        # pylint: disable=unsubscriptable-object
         self._liststore[index][1] = name
 
     def move_direction(self, direction):
@@ -237,13 +308,15 @@ class Thumbnail(Gtk.IconView):
         # Check for a user prefixed step
         step = self._app["eventhandler"].num_receive()
         # Get variables used for calculation of limits
+        # Computed from the columns as asking the iconview for the row and
+        # column of an item walks through all items
         last = len(self._app.get_paths())
-        rows = self.get_item_row(Gtk.TreePath(last - 1))
-        columns = self.get_columns()
+        columns = max(1, self.get_columns())
+        rows = (last - 1) // columns
         elem_last_row = last - rows * columns
         elem_per_row = floor((last - elem_last_row) / rows) if rows else last
-        column = self.get_item_column(Gtk.TreePath(new_pos))
-        row = self.get_item_row(Gtk.TreePath(new_pos))
+        column = new_pos % columns
+        row = new_pos // columns
         min_pos = 0
         max_pos = last - 1
         # Simple scrolls
@@ -289,9 +362,70 @@ class Thumbnail(Gtk.IconView):
         cell_renderer = self.get_cells()[0]
         self.set_cursor(Gtk.TreePath(pos), cell_renderer, False)
         self.scroll_to_path(Gtk.TreePath(pos), True, 0.5, 0.5)
+        self._centred_pos = pos
+        self._update_visible_range()
         # Clear the user prefixed step
         self._app["eventhandler"].num_clear()
 
+    def _on_vadjustment_set(self, iconview, param):
+        adjustment = self.get_vadjustment()
+        if adjustment is not self._vadjustment:
+            self._vadjustment = adjustment
+            if adjustment is not None:
+                adjustment.connect("value-changed", self._on_scrolled)
+                # Emitted when the layout changes the size of the view
+                adjustment.connect("changed", self._on_scrolled)
+
+    def _on_scrolled(self, adjustment):
+        if self.toggled:
+            self._update_visible_range()
+
+    def _update_visible_range(self):
+        """Create the thumbnails which are visible and close to them first."""
+        success, first, last = self.get_visible_range()
+        if success:
+            first, last = first.get_indices()[0], last.get_indices()[0]
+        else:  # Not laid out yet
+            first = last = self.get_position()
+        self._thumbnail_manager.scheduler.set_visible(first, last,
+                                                      self.get_position())
+        if self.toggled:
+            self._update_window(first, last)
+
+    def _update_window(self, first, last):
+        """Keep thumbnails only for the visible range and a margin around it.
+
+        Thumbnails leaving the window are replaced by the placeholder and their
+        pending requests are dropped. Memory and work therefore depend on the
+        size of the view instead of the amount of paths.
+
+        Args:
+            first: First visible position.
+            last: Last visible position.
+        """
+        # Some rows around the cursor even before the view is laid out
+        margin = max(last - first + 1, 64)
+        start = max(0, first - margin)
+        end = min(len(self._liststore), last + margin + 1)
+        self._window = (start, end)
+        # pylint: disable=unsubscriptable-object
+        for position in [position for position in self._scaled
+                         if not start <= position < end]:
+            del self._scaled[position]
+            if position < len(self._liststore):
+                self._liststore[position][0] = self._get_default_pixbuf()
+        for position in [position for position in self._requested
+                         if not start <= position < end]:
+            # Requests which are already processed are ignored when finished
+            if self._thumbnail_manager.scheduler.discard(position):
+                del self._requested[position]
+        size = self.get_zoom_level()[0]
+        paths = self._app.get_paths()
+        for position in range(start, min(end, len(paths))):
+            if position not in self._requested \
+                    and size not in self._get_scaled(position):
+                self._request_thumbnail(paths[position], position)
+
     def zoom(self, inc=True):
         """Zoom thumbnails.
 
@@ -305,16 +439,79 @@ class Thumbnail(Gtk.IconView):
             self._zoom_level_index -= 1
         else:
             return
-        # Rescale all images in liststore
+        # Rescale all images in liststore, the cursor is lost meanwhile
+        position = self.get_position()
         if self.toggled:
-            self.reload_all()
+            self._show_zoom_level()
         # Set columns and refocus current image
         self.calculate_columns()
-        self.move_to_pos(self.get_position())
+        self.move_to_pos(position)
+
+    def _show_zoom_level(self):
+        """Swap in the thumbnails scaled to the current zoom level.
+
+        Thumbnails loaded at a smaller size are scaled up from their largest
+        variant until the thumbnail of the new size is created. Missing
+        thumbnails are requested once the window is updated by move_to_pos.
+        """
+        size = self.get_zoom_level()[0]
+        default_pixbuf = self._get_default_pixbuf()
+        # Changing rows without a connected view avoids updating the layout
+        # for every single row
+        self.set_model(None)
+        for position, row in enumerate(self._liststore):
+            scaled = self._get_scaled(position)
+            if size in scaled:
+                row[0] = scaled[size]
+            elif scaled:
+                row[0] = self._thumbnail_manager.scale_pixbuf(
+                    scaled[max(scaled)], size)
+            else:
+                row[0] = default_pixbuf
+        self.set_model(self._liststore)
+
+    def _get_scaled(self, position):
+        """Return the dictionary of scaled thumbnails at position."""
+        return self._scaled.get(position, (None, {}))[1]
 
     def get_zoom_level(self):
         return self._zoom_levels[self._zoom_level_index]
 
+    def collect_garbage(self, report=True):
+        """Clean up the thumbnail cache in the background.
+
+        Args:
+            report: If True show the result in the statusbar.
+        """
+        if self._gc_thread is not None and self._gc_thread.is_alive():
+            if report:
+                self._app["statusbar"].message(
+                    "Thumbnail cleanup is already running", "warning")
+            return
+        budget = settings["thumbnail_disk_mb"].get_value() * 1024 * 1024
+        # Removing single files is safe to interrupt when quitting
+        self._gc_thread = Thread(target=self._thread_for_gc,
+                                 args=(budget, report), daemon=True)
+        self._gc_thread.start()
+
+    def _thread_for_gc(self, budget, report):
+        removed, freed = \
+            self._thumbnail_manager.thumbnail_store.collect_garbage(budget)
+        if report:
+            message = "Removed %d thumbnails, freed %.1f MiB" \
+                % (removed, freed / 1024 / 1024)
+            GLib.idle_add(self._app["statusbar"].message, message, "info")
+
+    def save_thumbnail(self, path, pixbuf):
+        """Create the thumbnail of an image decoded in image mode.
+
+        Args:
+            path: Path of the image.
+            pixbuf: The unedited GdkPixbuf.Pixbuf decoded from path.
+        """
+        self._thumbnail_manager.save_thumbnail_async(
+            path, pixbuf, self.get_zoom_level()[0])
+
     def get_cache_directory(self):
         return self._thumbnail_manager.thumbnail_store.base_dir
 
@@ -324,6 +521,10 @@ class Thumbnail(Gtk.IconView):
 
     def on_paths_changed(self):
         """Reload thumbnails properly when paths have changed."""
+        # Pending requests and scaled thumbnails refer to the old positions
+        self._thumbnail_manager.scheduler.clear()
+        self._requested.clear()
+        self._scaled.clear()
         diff = len(self._liststore) - len(self._app.get_paths())
         # Delete extra elements
         while diff > 0:
@@ -331,13 +532,16 @@ class Thumbnail(Gtk.IconView):
             self._liststore.remove(self._liststore[-1].iter)
             diff -= 1
         # Insert dummy elements to override
-        default_pixbuf = self._get_default_pixbuf() if diff < 0 else None
+        default_pixbuf = self._get_default_pixbuf()
         while diff < 0:
             name = self._get_name(self._app.get_paths()[diff])
             self._liststore.append([default_pixbuf, name])
             diff += 1
-        for path in self._app.get_paths():
-            self.reload(path)
+        for position, path in enumerate(self._app.get_paths()):
+            # pylint: disable=unsubscriptable-object
+            self._liststore[position][0] = default_pixbuf
+            self._reload_position(position, path, False)
+        self._update_visible_range()
 
     def _on_marks_changed(self, mark, changed):
         """Reload names if marks changed."""
@@ -346,14 +550,30 @@ class Thumbnail(Gtk.IconView):
                 self.reload(name, False)
         self._app["statusbar"].update_info()  # Do this once from here
 
-    def _on_transformations_applied_to_file(self, transform, files):
+    def _on_transformations_applied_to_file(self, transform, changes):
+        # Called from the thread of transform which is fine for writing the
+        # thumbnails, the liststore is updated in the main loop
         if self.toggled:
-            for name in files:
-                self.reload(name)
+            store = self._thumbnail_manager.thumbnail_store
+            for name, change in changes.items():
+                transformed = store.transform_thumbnail(name, change)
+                GLib.idle_add(self._reload_transformed, name, transformed)
+
+    def _reload_transformed(self, name, transformed):
+        """Reload the thumbnail of a transformed file.
+
+        Args:
+            name: Name of the transformed file.
+            transformed: If True, the thumbnail file was transformed and is
+                current. Else it is created again.
+        """
+        if name in self._app.get_paths():
+            self.reload(name, ignore_cache=not transformed)
+        return False  # Only run once
 
     def _on_search_completed(self, search, new_pos, last_focused):
         if self.toggled:
-            for path in self._app.get_paths():
-                self.reload(path, False)
+            for position, path in enumerate(self._app.get_paths()):
+                self._reload_position(position, path, False)
         if last_focused == "thu":
             self.move_to_pos(new_pos)
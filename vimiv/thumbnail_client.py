@@ -0,0 +1,72 @@
+# vim: ft=python fileencoding=utf-8 sw=4 et sts=4
+"""Requests thumbnails from the thumbnail daemon of vimiv.
+
+Each request is a line of json with the keys "path", "size" and
+"ignore_current" as in ThumbnailStore.get_thumbnail. The daemon answers with a
+line of json with the key "thumbnail" containing the path of the thumbnail
+file or null if the creation failed.
+"""
+
+import json
+import os
+import socket
+
+from vimiv.helpers import get_user_runtime_dir
+
+
+def get_socket_path():
+    """Return the path of the socket the daemon listens on."""
+    return os.path.join(get_user_runtime_dir(), "vimiv", "thumbnails.sock")
+
+
+class ThumbnailClient(object):
+    """Requests thumbnails from a running ThumbnailDaemon.
+
+    Attributes:
+        socket_path: Path of the unix socket the daemon listens on.
+        timeout: Seconds to wait for the daemon before giving up.
+    """
+
+    def __init__(self, socket_path=None, timeout=10):
+        self.socket_path = socket_path if socket_path else get_socket_path()
+        self.timeout = timeout
+
+    def is_available(self):
+        """Return True if a daemon may be listening on the socket."""
+        return os.path.exists(self.socket_path)
+
+    def is_running(self):
+        """Return True if a daemon accepts connections on the socket."""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                return False
+        return True
+
+    def get_thumbnail(self, path, size, ignore_current=False):
+        """Return the path of the thumbnail of path created by the daemon.
+
+        Args:
+            path: The filename to get the thumbnail for.
+            size: Size the thumbnail should have at least.
+            ignore_current: If True, ignore saved thumbnails and force a
+                recreation.
+        Return:
+            The path of the thumbnail file or None if the creation failed.
+            Raises OSError if the daemon cannot be reached or does not answer
+            in time.
+        """
+        request = json.dumps({"path": os.path.abspath(path), "size": size,
+                              "ignore_current": ignore_current}) + "\n"
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(request.encode("utf-8"))
+            with sock.makefile("rb") as f:
+                line = f.readline()
+        try:
+            return json.loads(line.decode("utf-8"))["thumbnail"]
+        except (ValueError, KeyError):
+            raise OSError("Invalid response of the thumbnail daemon")
@@ -0,0 +1,152 @@
+# vim: ft=python fileencoding=utf-8 sw=4 et sts=4
+"""Shares thumbnail creation between several vimiv instances.
+
+The ThumbnailDaemon is started with the --thumbnail-daemon commandline option
+and listens on a unix socket. It owns a single pool of workers and remembers
+created thumbnails, concurrent requests for the same file are only processed
+once. The ThumbnailManager sends its requests through the ThumbnailClient
+and creates thumbnails itself if no daemon is running.
+"""
+
+import collections
+import json
+import os
+import socketserver
+from multiprocessing.pool import ThreadPool as Pool
+from threading import Lock
+
+from vimiv.pixbuf_cache import PixbufCache
+from vimiv.thumbnail_client import ThumbnailClient, get_socket_path
+from vimiv.thumbnail_manager import ThumbnailStore
+
+
+class ThumbnailDaemon(object):
+    """Creates thumbnails for all vimiv instances connected to the socket.
+
+    Attributes:
+        socket_path: Path of the unix socket to listen on.
+
+        _lock: Lock for _pending and _results.
+        _max_results: Amount of thumbnail paths kept in _results.
+        _pending: Dictionary of requests which are being processed.
+            Key: (file key, tier, ignore_current); Item: AsyncResult
+        _results: OrderedDict of created thumbnails, least recently used
+            first. Key: (file key, tier); Item: path of the thumbnail
+        _store: ThumbnailStore creating the thumbnails.
+        _thread_pool: ThreadPool creating the thumbnails.
+    """
+
+    def __init__(self, socket_path=None, jobs=0, max_results=100000):
+        """Create the daemon.
+
+        Args:
+            socket_path: Path of the unix socket. Defaults to get_socket_path.
+            jobs: Number of threads creating thumbnails. 0 uses one per cpu.
+            max_results: Amount of created thumbnails to remember.
+        """
+        self.socket_path = socket_path if socket_path else get_socket_path()
+        self._lock = Lock()
+        self._max_results = max_results
+        self._pending = {}
+        self._results = collections.OrderedDict()
+        self._store = ThumbnailStore()
+        self._thread_pool = Pool(jobs if jobs > 0 else os.cpu_count())
+
+    def get_thumbnail(self, path, size, ignore_current=False):
+        """Return the path of the thumbnail of path creating it if needed.
+
+        Args:
+            path: The filename to get the thumbnail for.
+            size: Size the thumbnail should have at least.
+            ignore_current: If True, ignore saved thumbnails and force a
+                recreation.
+        Return:
+            The path of the thumbnail file or None if the creation failed.
+            Errors of the ThumbnailStore are raised.
+        """
+        file_key = PixbufCache.get_key(path)
+        # Files which cannot be accessed would all share the same key
+        if file_key is None:
+            return self._store.get_thumbnail(path, ignore_current, size)
+        tier = ThumbnailStore.get_tier(size)
+        key = (file_key, tier, ignore_current)
+        with self._lock:
+            if not ignore_current and key[:2] in self._results:
+                thumbnail = self._results[key[:2]]
+                # The thumbnail may have been removed by e.g. :thumbnail_gc
+                if thumbnail is None or os.path.isfile(thumbnail):
+                    self._results.move_to_end(key[:2])
+                    return thumbnail
+                del self._results[key[:2]]
+            # Wait for the running request of another instance instead of
+            # creating the same thumbnail twice
+            result = self._pending.get(key)
+            if result is None:
+                result = self._thread_pool.apply_async(
+                    self._store.get_thumbnail, (path, ignore_current, size))
+                self._pending[key] = result
+        try:
+            thumbnail = result.get()
+        finally:
+            # Failed requests are tried again by the next instance
+            with self._lock:
+                if self._pending.get(key) is result:
+                    del self._pending[key]
+        with self._lock:
+            self._results[key[:2]] = thumbnail
+            while len(self._results) > self._max_results:
+                self._results.popitem(last=False)
+        return thumbnail
+
+    def serve_forever(self):
+        """Listen on the socket until interrupted.
+
+        Raises OSError if another daemon is listening on the socket.
+        """
+        os.makedirs(os.path.dirname(self.socket_path), 0o700, exist_ok=True)
+        if os.path.exists(self.socket_path):
+            if ThumbnailClient(self.socket_path).is_running():
+                raise OSError("Another daemon is running on %s"
+                              % (self.socket_path))
+            # Remove the socket of a daemon which was not stopped properly
+            os.remove(self.socket_path)
+        server = _UnixServer(self.socket_path, self)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            os.remove(self.socket_path)
+
+
+class _UnixServer(socketserver.ThreadingMixIn,
+                  socketserver.UnixStreamServer):
+    """Server handling each connected vimiv instance in a thread.
+
+    Attributes:
+        thumbnail_daemon: ThumbnailDaemon answering the requests.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, thumbnail_daemon):
+        self.thumbnail_daemon = thumbnail_daemon
+        super(_UnixServer, self).__init__(socket_path, _RequestHandler)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Answers the requests of one connected vimiv instance."""
+
+    def handle(self):
+        """Answer each line sent until the connection is closed."""
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode("utf-8"))
+                thumbnail = self.server.thumbnail_daemon.get_thumbnail(
+                    request["path"], request["size"],
+                    request.get("ignore_current", False))
+            # Always answer, the client falls back to creating thumbnails
+            # itself if the connection is dropped
+            except Exception:  # pylint: disable=broad-except
+                thumbnail = None
+            response = json.dumps({"thumbnail": thumbnail}) + "\n"
+            self.wfile.write(response.encode("utf-8"))
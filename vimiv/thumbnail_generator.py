@@ -0,0 +1,70 @@
+# vim: ft=python fileencoding=utf-8 sw=4 et sts=4
+"""Create thumbnails for complete directories without starting the gui.
+
+Used by the --generate-thumbnails commandline option to fill the thumbnail
+cache in advance. Images with a current thumbnail or a failed attempt are
+skipped, so an interrupted run simply continues when started again.
+"""
+
+import os
+import sys
+from multiprocessing.pool import ThreadPool as Pool
+from time import time
+
+from vimiv.fileactions import is_image, recursive_search
+from vimiv.helpers import listdir_wrapper
+from vimiv.thumbnail_manager import ThumbnailStore
+
+
+def find_images(directory, recursive=False):
+    """Return all images in directory.
+
+    Args:
+        directory: Directory to search for images.
+        recursive: If True search the directory recursively.
+    """
+    if recursive:
+        paths = sorted(recursive_search(directory))
+    else:
+        paths = [os.path.join(directory, path)
+                 for path in listdir_wrapper(directory)]
+    return [os.path.abspath(path) for path in paths if is_image(path)]
+
+
+def generate_thumbnails(directory, recursive=False, jobs=0, tier="large",
+                        output=sys.stdout):
+    """Create missing thumbnails for all images in directory.
+
+    Args:
+        directory: Directory to create thumbnails for.
+        recursive: If True search the directory recursively.
+        jobs: Number of threads creating thumbnails. 0 uses one per cpu.
+        tier: Name of the thumbnail tier to create, one of
+            ThumbnailStore.TIERS.
+        output: File to write progress to.
+    Return:
+        Exit code, 0 if all thumbnails exist, 1 if some could not be created.
+    """
+    if not os.path.isdir(directory):
+        print("Not a directory: %s" % (directory), file=output)
+        return 1
+    store = ThumbnailStore()
+    store.use_tier(tier)
+    paths = find_images(directory, recursive)
+    todo = [path for path in paths if not store.has_thumbnail(path)]
+    print("%d images, %d thumbnails to create"
+          % (len(paths), len(todo)), file=output)
+    failed = 0
+    start = time()
+    with Pool(jobs if jobs > 0 else os.cpu_count()) as pool:
+        results = pool.imap_unordered(store.get_thumbnail, todo)
+        for done, thumbnail in enumerate(results, start=1):
+            if thumbnail is None:
+                failed += 1
+            elapsed = max(time() - start, 1e-6)
+            print("\r%d/%d created, %d failed, %.1f images/s"
+                  % (done, len(todo), failed, done / elapsed),
+                  end="", file=output, flush=True)
+    if todo:
+        print(file=output)
+    return 1 if failed else 0
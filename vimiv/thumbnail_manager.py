@@ -12,29 +12,206 @@ instead.
 
 import collections
 import hashlib
+import heapq
 import os
+import struct
 import tempfile
+import time
 from multiprocessing.pool import ThreadPool as Pool
+from threading import Lock
+from urllib.parse import unquote
 
 from gi._error import GError
 from gi.repository import GdkPixbuf, GLib, Gtk
 from gi.repository.GdkPixbuf import Pixbuf
 
+from vimiv.fileactions import get_file_info
 from vimiv.helpers import get_user_cache_dir
+from vimiv.pixbuf_cache import PixbufCache, fit_into
+from vimiv.thumbnail_client import ThumbnailClient
+
+# We need the try ... except wrapper here
+# pylint: disable=ungrouped-imports
+try:
+    from gi.repository import GExiv2
+    _has_exif = True
+except ImportError:
+    _has_exif = False
 
 ThumbTuple = collections.namedtuple('ThumbTuple', ['original', 'thumbnail'])
 
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def read_png_text(path):
+    """Read the tEXt chunks of a png file without decoding the image.
+
+    The freedesktop.org thumbnail standard stores the information on the
+    source file in tEXt chunks which come before the image data.
+
+    Args:
+        path: Path of the png file.
+    Return:
+        Dictionary of the keys and values of all tEXt chunks before the image
+        data. Empty if the file cannot be read or is no png.
+    """
+    text = {}
+    try:
+        with open(path, "rb") as f:
+            if f.read(8) != PNG_SIGNATURE:
+                return text
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    break
+                length, chunk_type = struct.unpack(">I4s", header)
+                if chunk_type in [b"IDAT", b"IEND"]:
+                    break
+                if chunk_type == b"tEXt":
+                    key, _, value = f.read(length).partition(b"\0")
+                    text[key.decode("latin-1")] = value.decode("latin-1")
+                    f.seek(4, os.SEEK_CUR)  # CRC
+                else:
+                    f.seek(length + 4, os.SEEK_CUR)
+    except OSError:
+        pass
+    return text
+
+
+def apply_orientation(pixbuf, orientation):
+    """Return pixbuf transformed according to an exif orientation.
+
+    Mirrors GdkPixbuf.Pixbuf.apply_embedded_orientation for pixbufs which do
+    not carry the orientation themselves, e.g. embedded previews.
+
+    Args:
+        pixbuf: The GdkPixbuf.Pixbuf to transform.
+        orientation: Exif orientation as integer from 1 to 8.
+    """
+    rotation = {3: GdkPixbuf.PixbufRotation.UPSIDEDOWN,
+                5: GdkPixbuf.PixbufRotation.COUNTERCLOCKWISE,
+                6: GdkPixbuf.PixbufRotation.CLOCKWISE,
+                7: GdkPixbuf.PixbufRotation.CLOCKWISE,
+                8: GdkPixbuf.PixbufRotation.COUNTERCLOCKWISE}
+    if orientation in rotation:
+        pixbuf = pixbuf.rotate_simple(rotation[orientation])
+    if orientation == 2:
+        pixbuf = pixbuf.flip(True)
+    elif orientation in [4, 5, 7]:
+        pixbuf = pixbuf.flip(False)
+    return pixbuf
+
+
+class ThumbnailScheduler(object):
+    """Hands out thumbnail requests closest to the visible range first.
+
+    Requests are ordered by the visible range of the view, then a margin of
+    the same size around it and then the rest. Within each of these positions
+    closer to the cursor come first.
+
+    Attributes:
+        _cursor: Position of the cursor in the view.
+        _heap: Heap of (priority, position) tuples of pending requests.
+        _lock: Lock as requests are taken by the worker threads.
+        _pending: Dictionary of pending requests.
+            Key: position; Item: tuple of arguments for the request.
+        _visible: Tuple of the first and last visible position.
+    """
+
+    def __init__(self):
+        self._cursor = 0
+        self._heap = []
+        self._lock = Lock()
+        self._pending = {}
+        self._visible = (0, 0)
+
+    def add(self, position, request):
+        """Add a request replacing any pending request for position.
+
+        Args:
+            position: Position of the thumbnail in the view.
+            request: Tuple of arguments for the request.
+        """
+        with self._lock:
+            self._pending[position] = request
+            heapq.heappush(self._heap, (self._get_priority(position), position))
+
+    def pop(self):
+        """Remove and return the most important request or None."""
+        with self._lock:
+            while self._heap:
+                _, position = heapq.heappop(self._heap)
+                if position in self._pending:
+                    return self._pending.pop(position)
+        return None
+
+    def discard(self, position):
+        """Drop the pending request for position.
+
+        Args:
+            position: Position of the thumbnail in the view.
+        Return:
+            True if a request was pending, False if there was none or it is
+            already being processed.
+        """
+        with self._lock:
+            # The heap entry is skipped by pop
+            return self._pending.pop(position, None) is not None
+
+    def set_visible(self, first, last, cursor):
+        """Re-prioritise pending requests for a new visible range.
+
+        Args:
+            first: First visible position.
+            last: Last visible position.
+            cursor: Position of the cursor.
+        """
+        with self._lock:
+            if (first, last) == self._visible and cursor == self._cursor:
+                return
+            self._visible = (first, last)
+            self._cursor = cursor
+            # Rebuilding also drops entries of requests which were replaced
+            self._heap = [(self._get_priority(position), position)
+                          for position in self._pending]
+            heapq.heapify(self._heap)
+
+    def clear(self):
+        """Drop all pending requests."""
+        with self._lock:
+            self._pending.clear()
+            self._heap = []
+
+    def _get_priority(self, position):
+        first, last = self._visible
+        margin = last - first + 1
+        if first <= position <= last:
+            tier = 0
+        elif first - margin <= position <= last + margin:
+            tier = 1
+        else:
+            tier = 2
+        return tier, abs(position - self._cursor)
+
 
 class ThumbnailManager:
     """Provides an asynchronous mechanism to load thumbnails.
 
     Attributes:
         thumbnail_store: ThumbnailStore class with the loading mechanism.
-        large: The thumbnail managing standard specifies two thumbnail sizes.
-            256x256 (large) and 128x128 (normal)
+        large: Default to large instead of normal thumbnails in the store.
         default_icon: Default icon if thumbnails are not yet loaded.
         error_icon: The path to the icon which is used, when thumbnail creation
                     fails.
+        scheduler: ThumbnailScheduler ordering the requests of this manager.
+        _cache: PixbufCache of loaded thumbnails shared by all managers.
+        _daemon_client: ThumbnailClient of a running thumbnail daemon or None
+            if thumbnails are created in this process.
+        _pending_save: Tuple of the arguments for the next thumbnail to save
+            from a decoded image or None.
+        _save_lock: Lock for _pending_save.
+        _save_pool: ThreadPool with a single worker saving thumbnails of
+            decoded images.
     """
 
     _cpu_count = os.cpu_count()
@@ -44,7 +221,8 @@ class ThumbnailManager:
         _cpu_count -= 1
 
     _thread_pool = Pool(_cpu_count)
-    _cache = {}
+    _save_pool = Pool(1)
+    _cache = PixbufCache("thumbnail_cache_mb")
 
     def __init__(self, large=True):
         """Construct a new ThumbnailManager.
@@ -55,6 +233,12 @@ class ThumbnailManager:
         """
         super(ThumbnailManager, self).__init__()
         self.thumbnail_store = ThumbnailStore(large=large)
+        self.scheduler = ThumbnailScheduler()
+        self._pending_save = None
+        self._save_lock = Lock()
+        self._daemon_client = ThumbnailClient()
+        if not self._daemon_client.is_available():
+            self._daemon_client = None
 
         # Default icon if thumbnail creation fails
         icon_theme = Gtk.IconTheme.get_default()
@@ -64,21 +248,46 @@ class ThumbnailManager:
                                                    0).get_filename()
 
     def _do_get_thumbnail_at_scale(self, source_file, size, callback, index,
-                                   ignore_cache=False):
-        if not ignore_cache and source_file in self._cache:
-            pixbuf = self._cache[source_file]
-        else:
-            thumbnail_path = self.thumbnail_store.get_thumbnail(source_file,
-                                                                ignore_cache)
-            if thumbnail_path is None:
-                thumbnail_path = self.error_icon
-            pixbuf = Pixbuf.new_from_file(thumbnail_path)
-            self._cache[source_file] = pixbuf
-
-        if pixbuf.get_height() != size and pixbuf.get_width != size:
-            pixbuf = self.scale_pixbuf(pixbuf, size)
-
-        return callback, pixbuf, index
+                                   ignore_cache=False, sizes=()):
+        tier_size = ThumbnailStore.TIERS[ThumbnailStore.get_tier(size)]
+        bound = (tier_size, tier_size)
+        pixbuf = None if ignore_cache else self._cache.get(source_file, bound)
+        if pixbuf is None:
+            pixbuf = self._load_thumbnail(source_file, size, ignore_cache)
+            self._cache.put(source_file, pixbuf, bound)
+
+        # Scale once to every size the loaded tier covers
+        scaled = {}
+        for scale in set(sizes) | {size}:
+            if scale > tier_size:
+                continue
+            if max(pixbuf.get_width(), pixbuf.get_height()) == scale:
+                scaled[scale] = pixbuf
+            else:
+                scaled[scale] = self.scale_pixbuf(pixbuf, scale)
+
+        return callback, scaled, index
+
+    def _load_thumbnail(self, source_file, size, ignore_cache):
+        """Load the thumbnail created by the daemon or by the store."""
+        client = self._daemon_client
+        if client is not None:
+            try:
+                thumbnail_path = client.get_thumbnail(source_file, size,
+                                                      ignore_cache)
+                if thumbnail_path is None:
+                    thumbnail_path = self.error_icon
+                return Pixbuf.new_from_file(thumbnail_path)
+            except OSError:
+                # The daemon was stopped or hangs, create thumbnails ourselves
+                self._daemon_client = None
+            except GError:
+                pass  # Removed in the meantime, create it again below
+        thumbnail_path = self.thumbnail_store.get_thumbnail(
+            source_file, ignore_cache, size)
+        if thumbnail_path is None:
+            thumbnail_path = self.error_icon
+        return Pixbuf.new_from_file(thumbnail_path)
 
     @staticmethod
     def scale_pixbuf(pixbuf, size):
@@ -106,33 +315,82 @@ class ThumbnailManager:
                                      GdkPixbuf.InterpType.BILINEAR)
         return pixbuf
 
+    def _do_scheduled(self):
+        request = self.scheduler.pop()
+        # The request was replaced or dropped
+        if request is None:
+            return None
+        return self._do_get_thumbnail_at_scale(*request)
+
     @staticmethod
     def _do_callback(result):
-        GLib.idle_add(*result)
+        if result is not None:
+            GLib.idle_add(*result)
+
+    def save_thumbnail_async(self, filename, pixbuf, size):
+        """Save the thumbnail of an already decoded image in the background.
+
+        Only the latest request is kept if the previous one was not processed
+        yet, so moving through images quickly does not keep large pixbufs
+        around.
+
+        Args:
+            filename: The filename the pixbuf was decoded from.
+            pixbuf: The unedited GdkPixbuf.Pixbuf.
+            size: Size the thumbnail should have at least.
+        """
+        with self._save_lock:
+            scheduled = self._pending_save is not None
+            self._pending_save = (filename, pixbuf, size)
+        if not scheduled:
+            self._save_pool.apply_async(self._do_save)
+
+    def _do_save(self):
+        with self._save_lock:
+            request, self._pending_save = self._pending_save, None
+        if request is not None:
+            self.thumbnail_store.save_thumbnail(*request)
 
     def get_thumbnail_at_scale_async(self, filename, size, callback, index,
-                                     ignore_cache=False):
+                                     ignore_cache=False, sizes=()):
         """Create the thumbnail for 'filename' and return it via 'callback'.
 
         Creates the thumbnail for the given filename at the given size and
-        then calls the given callback function with the resulting pixbuf.
+        then calls the given callback function with the resulting pixbufs.
+        Requests are processed in the order given by the scheduler, a new
+        request for the same index replaces the pending one.
 
         Args:
             filename: The filename to get the thumbnail for
             size: The size the returned pixbuf is scaled to
-            callback: A callable of form callback(pixbuf, *args)
-            args: Any additional arguments that can be passed to callback
+            callback: A callable of form callback(scaled, index) where scaled
+                is a dictionary of the pixbufs by the size they are scaled to
+            index: Position of the thumbnail passed to callback
             ignore_cache: If true, the builtin in-memory cache is bypassed and
                           the thumbnail file is loaded from disk
+            sizes: Further sizes the pixbuf is scaled to if the thumbnail
+                loaded for size is large enough
         """
-        self._thread_pool.apply_async(self._do_get_thumbnail_at_scale,
-                                      (filename, size, callback, index,
-                                       ignore_cache),
+        self.scheduler.add(index, (filename, size, callback, index,
+                                   ignore_cache, sizes))
+        self._thread_pool.apply_async(self._do_scheduled,
                                       callback=self._do_callback)
 
 
 class ThumbnailStore(object):
-    """Implements freedesktop.org's Thumbnail Managing Standard."""
+    """Implements freedesktop.org's Thumbnail Managing Standard.
+
+    Attributes:
+        TIERS: OrderedDict of the thumbnail directories defined by the
+            standard and the size of their thumbnails, smallest first.
+        tier: Name of the tier used if no size is requested.
+        _index: Dictionary of the files in the thumbnail directories.
+            Key: directory; Item: list of the mtime of the directory, the time
+            it was last checked and the set of filenames
+        _index_lock: Lock as the index is accessed from thumbnail threads.
+        _thumbnail_filenames: Dictionary of the thumbnail filename by source
+            uri.
+    """
 
     KEY_URI = "Thumb::URI"
     KEY_MTIME = "Thumb::MTime"
@@ -140,6 +398,12 @@ class ThumbnailStore(object):
     KEY_WIDTH = "Thumb::Image::Width"
     KEY_HEIGHT = "Thumb::Image::Height"
 
+    TIERS = collections.OrderedDict([("normal", 128), ("large", 256),
+                                     ("x-large", 512), ("xx-large", 1024)])
+
+    # Seconds between checks whether a directory of the index changed
+    INDEX_INTERVAL = 1
+
     def __init__(self, large=True):
         """Construct a new ThumbnailStore.
 
@@ -154,6 +418,10 @@ class ThumbnailStore(object):
             self.base_dir, "fail", "vimiv-" + vimiv.__version__)
         self.thumbnail_dir = ""
         self.thumb_size = 0
+        self.tier = ""
+        self._index = {}
+        self._index_lock = Lock()
+        self._thumbnail_filenames = {}
         self.use_large_thumbnails(large)
         self._ensure_dirs_exist()
 
@@ -165,14 +433,31 @@ class ThumbnailStore(object):
         Args:
             enabled: If true large thumbnails will be used.
         """
-        if enabled:
-            self.thumbnail_dir = os.path.join(self.base_dir, "large")
-            self.thumb_size = 256
-        else:
-            self.thumbnail_dir = os.path.join(self.base_dir, "normal")
-            self.thumb_size = 128
+        self.use_tier("large" if enabled else "normal")
+
+    def use_tier(self, tier):
+        """Specify the thumbnail tier used if no size is requested.
+
+        Args:
+            tier: Name of the tier, one of TIERS.
+        """
+        self.tier = tier
+        self.thumbnail_dir = os.path.join(self.base_dir, tier)
+        self.thumb_size = self.TIERS[tier]
+
+    @classmethod
+    def get_tier(cls, size):
+        """Return the name of the smallest tier covering size.
 
-    def get_thumbnail(self, filename, ignore_current=False):
+        Args:
+            size: Size in pixels the thumbnail should have at least.
+        """
+        for tier, tier_size in cls.TIERS.items():
+            if tier_size >= size:
+                return tier
+        return "xx-large"
+
+    def get_thumbnail(self, filename, ignore_current=False, size=None):
         """Get the path of the thumbnail of the given filename.
 
         If the requested thumbnail does not yet exist, it will first be created
@@ -183,6 +468,9 @@ class ThumbnailStore(object):
             ignore_current: If True, ignore saved thumbnails and force a
                 recreation. Needed as transforming images from within thumbnail
                 mode may happen faster than in 1s.
+            size: Size the thumbnail should have at least. The thumbnail of the
+                smallest tier covering it is returned. Defaults to the size of
+                the tier of the store.
 
         Return:
             The path of the thumbnail file or None if thumbnail creation failed.
@@ -191,43 +479,314 @@ class ThumbnailStore(object):
         if filename.startswith(self.base_dir):
             return filename
 
+        tier = self.get_tier(size) if size else self.tier
         thumbnail_filename = self._get_thumbnail_filename(filename)
-        thumbnail_path = self._get_thumbnail_path(thumbnail_filename)
-        if os.access(thumbnail_path, os.R_OK) \
+        thumbnail_path = self._get_thumbnail_path(thumbnail_filename, tier)
+        if self._has_entry(thumbnail_path) \
                 and self._is_current(filename, thumbnail_path) \
                 and not ignore_current:
             return thumbnail_path
 
         fail_path = self._get_fail_path(thumbnail_filename)
-        if os.path.exists(fail_path):
+        if self._has_entry(fail_path):
             # We already tried to create a thumbnail for the given file but
             # failed; don't try again.
             return None
 
-        if self._create_thumbnail(filename, thumbnail_filename):
+        if self._create_thumbnail(filename, thumbnail_filename, tier,
+                                  not ignore_current):
             return thumbnail_path
 
         return None
 
+    def save_thumbnail(self, filename, pixbuf, size=None):
+        """Create the thumbnail of filename from an already decoded image.
+
+        Args:
+            filename: The filename to create the thumbnail for.
+            pixbuf: The unedited GdkPixbuf.Pixbuf decoded from filename. It may
+                be shrunk but must not be smaller than the thumbnail.
+            size: Size the thumbnail should have at least as in get_thumbnail.
+        Return:
+            The path of the thumbnail file or None if it was not created.
+        """
+        if filename.startswith(self.base_dir):
+            return None
+        tier = self.get_tier(size) if size else self.tier
+        thumb_size = self.TIERS[tier]
+        width, height = pixbuf.get_width(), pixbuf.get_height()
+        if max(width, height) < thumb_size:
+            return None
+        thumbnail_filename = self._get_thumbnail_filename(filename)
+        thumbnail_path = self._get_thumbnail_path(thumbnail_filename, tier)
+        try:
+            if self._has_entry(thumbnail_path) \
+                    and self._is_current(filename, thumbnail_path):
+                return thumbnail_path
+            # Scaling drops the orientation option set by the loader
+            orientation = pixbuf.get_option("orientation")
+            image = pixbuf.scale_simple(
+                *fit_into(width, height, (thumb_size, thumb_size)),
+                GdkPixbuf.InterpType.BILINEAR)
+            if orientation:
+                image = apply_orientation(image, int(orientation))
+            self._write_thumbnail(filename, image, thumbnail_path)
+        except (GError, OSError, ValueError):
+            return None
+        return thumbnail_path
+
+    def transform_thumbnail(self, filename, change):
+        """Apply the rotation and flips of a transformed file to its thumbnails.
+
+        This is much faster than decoding the transformed file again.
+
+        Args:
+            filename: The filename which was transformed.
+            change: transform.AppliedChange of the file.
+        Return:
+            True if any thumbnail was transformed, False if they have to be
+            created again.
+        """
+        # Thumbnails show the image with its exif orientation applied
+        if change.orientation != 1:
+            return False
+        thumbnail_filename = self._get_thumbnail_filename(filename)
+        transformed = False
+        for tier in self.TIERS:
+            path = self._get_thumbnail_path(thumbnail_filename, tier)
+            # Only thumbnails which were current before the transformation
+            if not self._has_entry(path) or read_png_text(path).get(
+                    self.KEY_MTIME) != str(change.mtime):
+                continue
+            try:
+                image = Pixbuf.new_from_file(path)
+                if change.rotate:
+                    image = image.rotate_simple(90 * change.rotate)
+                if change.flip_horizontal:
+                    image = image.flip(True)
+                if change.flip_vertical:
+                    image = image.flip(False)
+                self._write_thumbnail(filename, image, path)
+            except (GError, OSError):
+                continue
+            transformed = True
+        return transformed
+
+    def has_thumbnail(self, filename, size=None):
+        """Check whether the thumbnail of filename needs no creation.
+
+        Args:
+            filename: The filename to check the thumbnail of.
+            size: Size the thumbnail should have at least as in get_thumbnail.
+        Return:
+            True if a current thumbnail exists or its creation failed before.
+        """
+        tier = self.get_tier(size) if size else self.tier
+        thumbnail_filename = self._get_thumbnail_filename(filename)
+        thumbnail_path = self._get_thumbnail_path(thumbnail_filename, tier)
+        if self._has_entry(thumbnail_path) \
+                and self._is_current(filename, thumbnail_path):
+            return True
+        return self._has_entry(self._get_fail_path(thumbnail_filename))
+
+    def collect_garbage(self, budget=0):
+        """Remove outdated thumbnails and limit the size of the cache.
+
+        Thumbnails and fail files of sources which were deleted, moved or
+        changed are removed as well as the fail files of other vimiv versions.
+        If the remaining files use more than budget, the least recently used
+        ones are removed.
+
+        Args:
+            budget: Bytes the thumbnail cache may use. 0 means no limit.
+        Return:
+            Tuple of the amount of removed files and the bytes they used.
+        """
+        outdated, kept, old_fail_dirs = self._find_outdated()
+        if budget:
+            outdated.extend(self._trim_to_budget(kept, budget))
+        removed = freed = 0
+        for path, size in outdated:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._remove_entry(path)
+            removed += 1
+            freed += size
+        for directory in old_fail_dirs:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+        return removed, freed
+
+    def _find_outdated(self):
+        """Find outdated thumbnails and fail files for collect_garbage.
+
+        Return:
+            Tuple of a list of (path, size) of the outdated files, a list of
+            (last used, path, size) of the remaining files and a list of the
+            fail directories of other vimiv versions.
+        """
+        outdated = []
+        kept = []
+        directories = [os.path.join(self.base_dir, tier) for tier in self.TIERS]
+        directories.append(self.fail_dir)
+        for directory in directories:
+            for entry in self._scan(directory):
+                try:
+                    stat = entry.stat()
+                except OSError:  # Removed in the meantime
+                    continue
+                if self._is_outdated(entry.path):
+                    outdated.append((entry.path, stat.st_size))
+                else:
+                    # Access times are not updated on all file systems
+                    last_used = max(stat.st_atime, stat.st_mtime)
+                    kept.append((last_used, entry.path, stat.st_size))
+        old_fail_dirs = []
+        for entry in self._scan(os.path.dirname(self.fail_dir), True):
+            if not entry.name.startswith("vimiv-") \
+                    or entry.path == self.fail_dir:
+                continue
+            old_fail_dirs.append(entry.path)
+            for fail_entry in self._scan(entry.path):
+                try:
+                    outdated.append((fail_entry.path,
+                                     fail_entry.stat().st_size))
+                except OSError:  # Removed in the meantime
+                    continue
+        return outdated, kept, old_fail_dirs
+
+    @staticmethod
+    def _trim_to_budget(kept, budget):
+        """Return (path, size) of the least recently used files over budget.
+
+        Args:
+            kept: List of (last used, path, size) of the remaining files.
+            budget: Bytes the thumbnail cache may use.
+        """
+        used = sum(size for _, _, size in kept)
+        removed = []
+        for _, path, size in sorted(kept):
+            if used <= budget:
+                break
+            removed.append((path, size))
+            used -= size
+        return removed
+
+    def _is_outdated(self, thumbnail_path):
+        """Check whether the source of a thumbnail was removed or changed."""
+        text = read_png_text(thumbnail_path)
+        uri = text.get(self.KEY_URI, "")
+        # Only sources of local files can be checked
+        if not uri.startswith("file://"):
+            return False
+        source = uri[len("file://"):]
+        # Other programs store percent-encoded uris
+        if not os.path.exists(source):
+            source = unquote(source)
+        try:
+            mtime = self._get_source_mtime(source)
+        except OSError:
+            return True
+        return text.get(self.KEY_MTIME) != str(mtime)
+
+    @staticmethod
+    def _scan(directory, directories=False):
+        """Return the files or directories in directory as os.DirEntry."""
+        try:
+            with os.scandir(directory) as entries:
+                return [entry for entry in entries
+                        if entry.is_dir() is directories]
+        except OSError:
+            return []
+
+    def _has_entry(self, path):
+        """Check whether the thumbnail or fail file path exists.
+
+        The files of each directory are listed with a single scandir pass on
+        first use and added as thumbnails are written. This avoids checking
+        every single file which is slow e.g. on network file systems.
+        Directories are listed again if their mtime changed, so files written
+        by other programs are noticed within INDEX_INTERVAL seconds.
+
+        Args:
+            path: Path of the file in one of the thumbnail directories.
+        """
+        directory, filename = os.path.split(path)
+        with self._index_lock:
+            return filename in self._get_index(directory)[2]
+
+    def _get_index(self, directory):
+        """Return the index of directory, the caller must hold the lock."""
+        now = time.time()
+        index = self._index.get(directory)
+        if index is not None and now - index[1] < self.INDEX_INTERVAL:
+            return index
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            mtime = None
+        # Changes within the resolution of the mtime after the directory was
+        # listed cannot be noticed, so recently changed ones are listed again
+        if index is not None and mtime == index[0] and mtime is not None \
+                and mtime + self.INDEX_INTERVAL < index[1]:
+            index[1] = now
+            return index
+        try:
+            with os.scandir(directory) as entries:
+                names = {entry.name for entry in entries}
+        except OSError:
+            names = set()
+        self._index[directory] = [mtime, now, names]
+        return self._index[directory]
+
+    def _add_entry(self, path):
+        directory, filename = os.path.split(path)
+        with self._index_lock:
+            if directory in self._index:
+                self._index[directory][2].add(filename)
+
+    def _remove_entry(self, path):
+        directory, filename = os.path.split(path)
+        with self._index_lock:
+            if directory in self._index:
+                self._index[directory][2].discard(filename)
+
     def _ensure_dirs_exist(self):
-        os.makedirs(self.thumbnail_dir, 0o700, exist_ok=True)
+        for tier in self.TIERS:
+            os.makedirs(os.path.join(self.base_dir, tier), 0o700,
+                        exist_ok=True)
         os.makedirs(self.fail_dir, 0o700, exist_ok=True)
 
     def _is_current(self, source_file, thumbnail_path):
+        # Decoding the image just to read the options would be wasteful
+        text = read_png_text(thumbnail_path)
         source_mtime = str(self._get_source_mtime(source_file))
-        thumbnail_mtime = self._get_thumbnail_mtime(thumbnail_path)
-        return source_mtime == thumbnail_mtime
+        if text.get(self.KEY_MTIME) != source_mtime:
+            return False
+        # The mtime only has a resolution of seconds, comparing the size
+        # catches most files which were changed within the same second
+        size = text.get(self.KEY_SIZE)
+        return size is None or size == str(os.path.getsize(source_file))
 
     def _get_thumbnail_filename(self, filename):
         uri = self._get_source_uri(filename)
-        return hashlib.md5(bytes(uri, "UTF-8")).hexdigest() + ".png"
+        thumbnail_filename = self._thumbnail_filenames.get(uri)
+        if thumbnail_filename is None:
+            thumbnail_filename = \
+                hashlib.md5(bytes(uri, "UTF-8")).hexdigest() + ".png"
+            self._thumbnail_filenames[uri] = thumbnail_filename
+        return thumbnail_filename
 
     @staticmethod
     def _get_source_uri(filename):
         return "file://" + os.path.abspath(os.path.expanduser(filename))
 
-    def _get_thumbnail_path(self, thumbnail_filename):
-        return os.path.join(self.thumbnail_dir, thumbnail_filename)
+    def _get_thumbnail_path(self, thumbnail_filename, tier):
+        return os.path.join(self.base_dir, tier, thumbnail_filename)
 
     def _get_fail_path(self, thumbnail_filename):
         return os.path.join(self.fail_dir, thumbnail_filename)
@@ -236,33 +795,115 @@ class ThumbnailStore(object):
     def _get_source_mtime(src):
         return int(os.path.getmtime(src))
 
-    def _get_thumbnail_mtime(self, thumbnail_path):
-        pixbuf = Pixbuf.new_from_file(thumbnail_path)
-        mtime = pixbuf.get_options()["tEXt::" + self.KEY_MTIME]
+    def _load_larger_thumbnail(self, source_file, thumbnail_filename, tier):
+        """Load the thumbnail scaled down from a larger tier.
 
-        return mtime
+        Args:
+            source_file: The file to load the thumbnail of.
+            thumbnail_filename: Filename of the thumbnails of source_file.
+            tier: Name of the tier to load the thumbnail for.
+        Return:
+            The pixbuf scaled from the current thumbnail of the next larger
+            tier or None if there is none.
+        """
+        size = self.TIERS[tier]
+        for larger_tier, larger_size in self.TIERS.items():
+            if larger_size <= size:
+                continue
+            path = self._get_thumbnail_path(thumbnail_filename, larger_tier)
+            if self._has_entry(path) and self._is_current(source_file, path):
+                try:
+                    return Pixbuf.new_from_file_at_scale(path, size, size,
+                                                         True)
+                except GError:
+                    continue
+        return None
 
-    def _create_thumbnail(self, source_file, thumbnail_filename):
+    def _load_embedded_preview(self, source_file, size):
+        """Load the thumbnail from a preview embedded in source_file.
+
+        Decoding a small embedded preview is much faster than decoding e.g.
+        large jpegs or raw files.
+
+        Args:
+            source_file: The file to load the preview of.
+            size: Size of the thumbnail.
+        Return:
+            The oriented pixbuf scaled to the thumbnail size or None if there
+            is no preview at least as large as the thumbnail size.
+        """
+        if not _has_exif:
+            return None
+        info = get_file_info(source_file)
+        if info is None:
+            return None
+        try:
+            exif = GExiv2.Metadata(source_file)
+        except GLib.Error:
+            return None
+        # The exif dimensions are kept when the image is edited, the real ones
+        # are not
+        width, height = info.width, info.height
+        previews = []
+        for properties in exif.get_preview_properties():
+            preview_width = properties.get_width()
+            preview_height = properties.get_height()
+            if max(preview_width, preview_height) < size:
+                continue
+            # Previews with black bars would show up in the thumbnail
+            if width and height and abs(preview_width / preview_height -
+                                        width / height) > 0.01:
+                continue
+            previews.append((preview_width * preview_height, properties))
+        if not previews:
+            return None
+        _, properties = min(previews, key=lambda preview: preview[0])
+        loader = GdkPixbuf.PixbufLoader()
+        try:
+            loader.write(exif.get_preview_image(properties).get_data())
+            loader.close()
+        except GLib.Error:
+            return None
+        pixbuf = loader.get_pixbuf()
+        new_width, new_height = fit_into(pixbuf.get_width(),
+                                         pixbuf.get_height(),
+                                         (size, size))
+        pixbuf = pixbuf.scale_simple(new_width, new_height,
+                                     GdkPixbuf.InterpType.BILINEAR)
+        return apply_orientation(pixbuf, int(exif.get_orientation()))
+
+    def _create_thumbnail(self, source_file, thumbnail_filename, tier,
+                          derive=True):
         # Cannot access source; create neither thumbnail nor fail file
         if not os.access(source_file, os.R_OK):
             return False
 
+        size = self.TIERS[tier]
         try:
-            image = Pixbuf.new_from_file_at_scale(source_file, self.thumb_size,
-                                                  self.thumb_size, True)
-            dest_path = self._get_thumbnail_path(thumbnail_filename)
+            # Scaling an existing larger thumbnail avoids decoding the source
+            image = self._load_larger_thumbnail(
+                source_file, thumbnail_filename, tier) if derive else None
+            if image is None:
+                image = self._load_embedded_preview(source_file, size)
+            if image is None:
+                image = Pixbuf.new_from_file_at_scale(source_file, size, size,
+                                                      True)
+                image = image.apply_embedded_orientation()
+            dest_path = self._get_thumbnail_path(thumbnail_filename, tier)
             success = True
         except GError:
             image = Pixbuf.new(GdkPixbuf.Colorspace.RGB, False, 8, 1, 1)
             dest_path = self._get_fail_path(thumbnail_filename)
             success = False
 
-        width = 0
-        height = 0
-        try:
-            _, width, height = GdkPixbuf.Pixbuf.get_file_info(source_file)
-        except IOError:
-            pass
+        self._write_thumbnail(source_file, image, dest_path)
+        return success
+
+    def _write_thumbnail(self, source_file, image, dest_path):
+        """Write the thumbnail image of source_file to dest_path."""
+        info = get_file_info(source_file)
+        width = info.width if info else 0
+        height = info.height if info else 0
 
         options = {
             "tEXt::" + self.KEY_URI: str(self._get_source_uri(source_file)),
@@ -283,5 +924,4 @@ class ThumbnailStore(object):
         image.savev(tmp_filename, "png", list(options.keys()),
                     list(options.values()))
         os.replace(tmp_filename, dest_path)
-
-        return success
+        self._add_entry(dest_path)
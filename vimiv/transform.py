@@ -2,6 +2,7 @@
 """Deals with transformations like rotate and flip and deleting files."""
 
 import os
+from collections import namedtuple
 from threading import Thread
 
 from gi.repository import GObject
@@ -13,6 +14,10 @@ from vimiv.helpers import get_int
 from vimiv.settings import settings
 from vimiv.trash_manager import TrashManager
 
+AppliedChange = namedtuple("AppliedChange",
+                           ["rotate", "flip_horizontal", "flip_vertical",
+                            "mtime", "orientation"])
+
 
 class Transform(GObject.Object):
     """Deals with transformations like rotate/flip and deleting files.
@@ -27,7 +32,10 @@ class Transform(GObject.Object):
 
     Signals:
         changed: Emitted when an image was transformed so Image can update.
-        applied-to-file: Emitted when the file was successfully transformed.
+        applied-to-file: Emitted when files were successfully transformed
+            with a dictionary of the changes. Key: filename; Item:
+            AppliedChange including mtime and exif orientation of the file
+            before the transformation, orientation is 0 if unknown.
     """
 
     def __init__(self, app):
@@ -156,17 +164,22 @@ class Transform(GObject.Object):
     def _thread_for_apply(self):
         """Rotate and flip image file in an extra thread."""
         self.threads_running = True
-        to_remove = list(self._changes.keys())
+        applied = {}
         for f in self._changes:
+            # Allows updating e.g. thumbnails instead of recreating them
+            mtime = int(os.path.getmtime(f))
+            orientation = imageactions.get_orientation(f)
             if self._changes[f][0]:
                 imageactions.rotate_file(f, self._changes[f][0])
             if self._changes[f][1]:
                 imageactions.flip_file(f, True)
             if self._changes[f][2]:
                 imageactions.flip_file(f, False)
-        for key in to_remove:
+            applied[f] = AppliedChange(*self._changes[f], mtime=mtime,
+                                       orientation=orientation)
+        for key in applied:
             del self._changes[key]
-        self.emit("applied-to-file", to_remove)
+        self.emit("applied-to-file", applied)
         self.threads_running = False
 
     def _is_transformable(self):